@@ -0,0 +1,41 @@
+"""回答時間記録のオーバーヘッド計測
+
+python bench_answer_capture.py [回答数]
+
+回答ボタン1回あたりの処理（回答済みチェック＋記録）を、
+回答時間を記録しない従来方式（リストへの追記）と比較する。
+"""
+import sys
+import time
+import timeit
+from round_stats import RoundAnswers
+
+def bench_baseline(n):
+    answered_users = []
+    round_answers = []
+    for user_id in range(n):
+        if user_id in answered_users:
+            continue
+        answered_users.append(user_id)
+        round_answers.append((user_id, "title", True))
+
+def bench_capture(n):
+    started_at = time.monotonic()
+    round_answers = RoundAnswers()
+    for user_id in range(n):
+        received_at = time.monotonic()
+        if user_id in round_answers:
+            continue
+        round_answers.add(user_id, "title", True, received_at - started_at)
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repeat = 20
+    for name, func in (("従来方式（リスト）", bench_baseline), ("回答時間記録（配列）", bench_capture)):
+        best = min(timeit.repeat(lambda: func(n), number=1, repeat=repeat))
+        print(f"{name}: {best / n * 1e9:.0f} ns/回答 (回答数 {n})")
+    round_answers = RoundAnswers()
+    for user_id in range(n):
+        round_answers.add(user_id, "title", True, user_id * 0.01)
+    best = min(timeit.repeat(round_answers.stats, number=1, repeat=repeat))
+    print(f"ラウンド統計の計算: {best * 1e6:.0f} µs (回答数 {n})")
@@ -1,14 +1,20 @@
 import discord
 from discord.ext import commands
+import diagnostics
+from scoreboard import ScoreboardRenderer
 
 class CommandHandler:
-    def __init__(self, bot, game_manager, game_guild_id, command_guild_id, game_channel_id, command_channel_id):
+    def __init__(self, bot, game_manager, game_guild_id, command_guild_id, game_channel_id, command_channel_id, admin_user_ids=None):
         self.bot = bot
         self.game_manager = game_manager
         self.game_guild_id = game_guild_id
         self.command_guild_id = command_guild_id
         self.game_channel_id = game_channel_id
         self.command_channel_id = command_channel_id
+        self.trace_recorder = None  # トレース記録（main.pyで設定）
+        self.admin_user_ids = admin_user_ids or []
+        self.loop_monitor = None  # イベントループ監視（main.pyで設定）
+        self.scoreboard = ScoreboardRenderer(bot)
     
     async def check_guild_permission(self, ctx, required_guild_id, guild_type):
         """指定されたサーバーでのみコマンドを実行可能にする"""
@@ -30,6 +36,17 @@ class CommandHandler:
             return False
         return True
     
+    def is_admin(self, user):
+        """管理者（admin_user_idsに含まれるか、サーバーの管理者権限を持つ）かどうかを判定"""
+        if user.id in self.admin_user_ids:
+            return True
+        permissions = getattr(user, "guild_permissions", None)
+        return bool(permissions and permissions.administrator)
+    
+    def create_diagnostics_report(self):
+        """診断結果のメッセージを作成"""
+        return diagnostics.format_report(self.loop_monitor, self.game_manager)
+    
     async def send_to_game_channel(self, ctx, message, file=None, view=None):
         """ゲーム用サーバーとチャンネルにメッセージを送信"""
         if self.game_guild_id is None or self.game_channel_id is None:
@@ -43,6 +60,8 @@ class CommandHandler:
             game_guild = self.bot.get_guild(self.game_guild_id)
             if game_guild:
                 game_channel = game_guild.get_channel(self.game_channel_id)
+                if self.trace_recorder:
+                    game_channel = self.trace_recorder.wrap_channel(game_channel)
                 if game_channel:
                     if file:
                         await game_channel.send(message, file=file, view=view)
@@ -53,13 +72,25 @@ class CommandHandler:
             else:
                 await ctx.send("ゲームサーバーが見つかりません。", delete_after=5.0)
     
+    def get_game_channel(self, ctx):
+        """ゲーム用チャンネルを取得（未設定の場合はコマンドを実行したチャンネル）"""
+        if self.game_guild_id is None or self.game_channel_id is None:
+            return ctx.channel
+        game_guild = self.bot.get_guild(self.game_guild_id)
+        game_channel = game_guild.get_channel(self.game_channel_id) if game_guild else None
+        if self.trace_recorder:
+            game_channel = self.trace_recorder.wrap_channel(game_channel)
+        return game_channel
+    
     def create_command_buttons(self):
         """コマンド用のボタンを作成"""
         buttons = [
             discord.ui.Button(label="開始", style=discord.ButtonStyle.success, custom_id="cmd_start"),
             discord.ui.Button(label="出題", style=discord.ButtonStyle.primary, custom_id="cmd_next"),
+            discord.ui.Button(label="スピード", style=discord.ButtonStyle.primary, custom_id="cmd_speed"),
             discord.ui.Button(label="正解", style=discord.ButtonStyle.secondary, custom_id="cmd_answer"),
-            discord.ui.Button(label="スコア", style=discord.ButtonStyle.danger, custom_id="cmd_score")
+            discord.ui.Button(label="スコア", style=discord.ButtonStyle.danger, custom_id="cmd_score"),
+            discord.ui.Button(label="診断", style=discord.ButtonStyle.secondary, custom_id="cmd_diag")
         ]
         view = discord.ui.View()
         for button in buttons:
@@ -71,8 +102,10 @@ class CommandHandler:
         buttons = [
             discord.ui.Button(label="開始", style=discord.ButtonStyle.success, custom_id="cmd_start", disabled=True),
             discord.ui.Button(label="出題", style=discord.ButtonStyle.primary, custom_id="cmd_next", disabled=True),
+            discord.ui.Button(label="スピード", style=discord.ButtonStyle.primary, custom_id="cmd_speed", disabled=True),
             discord.ui.Button(label="正解", style=discord.ButtonStyle.secondary, custom_id="cmd_answer", disabled=True),
-            discord.ui.Button(label="スコア", style=discord.ButtonStyle.danger, custom_id="cmd_score", disabled=True)
+            discord.ui.Button(label="スコア", style=discord.ButtonStyle.danger, custom_id="cmd_score", disabled=True),
+            discord.ui.Button(label="診断", style=discord.ButtonStyle.secondary, custom_id="cmd_diag")
         ]
         view = discord.ui.View()
         for button in buttons:
@@ -84,8 +117,10 @@ class CommandHandler:
         buttons = [
             discord.ui.Button(label="開始", style=discord.ButtonStyle.success, custom_id="cmd_start", disabled=True),
             discord.ui.Button(label="出題", style=discord.ButtonStyle.primary, custom_id="cmd_next"),
+            discord.ui.Button(label="スピード", style=discord.ButtonStyle.primary, custom_id="cmd_speed"),
             discord.ui.Button(label="正解", style=discord.ButtonStyle.secondary, custom_id="cmd_answer"),
-            discord.ui.Button(label="スコア", style=discord.ButtonStyle.danger, custom_id="cmd_score")
+            discord.ui.Button(label="スコア", style=discord.ButtonStyle.danger, custom_id="cmd_score"),
+            discord.ui.Button(label="診断", style=discord.ButtonStyle.secondary, custom_id="cmd_diag")
         ]
         view = discord.ui.View()
         for button in buttons:
@@ -97,8 +132,10 @@ class CommandHandler:
         buttons = [
             discord.ui.Button(label="開始", style=discord.ButtonStyle.success, custom_id="cmd_start", disabled=True),
             discord.ui.Button(label="出題", style=discord.ButtonStyle.primary, custom_id="cmd_next", disabled=True),
+            discord.ui.Button(label="スピード", style=discord.ButtonStyle.primary, custom_id="cmd_speed", disabled=True),
             discord.ui.Button(label="正解", style=discord.ButtonStyle.secondary, custom_id="cmd_answer"),
-            discord.ui.Button(label="スコア", style=discord.ButtonStyle.danger, custom_id="cmd_score")
+            discord.ui.Button(label="スコア", style=discord.ButtonStyle.danger, custom_id="cmd_score"),
+            discord.ui.Button(label="診断", style=discord.ButtonStyle.secondary, custom_id="cmd_diag")
         ]
         view = discord.ui.View()
         for button in buttons:
@@ -141,6 +178,7 @@ class CommandHandler:
         
         # ゲーム状態を初期化
         await self.game_manager.start_game(game_guild_id, members)
+        self.scoreboard.end_game(game_guild_id)  # 前のゲームのスコアボードを切り離す
         
         # ゲーム開始メッセージをゲームチャンネルに送信
         await self.send_to_game_channel(ctx, "楽曲クイズを始めるわよ！")
@@ -171,6 +209,11 @@ class CommandHandler:
         # ゲームサーバーIDを取得
         game_guild_id = self.game_guild_id or ctx.guild.id
         
+        # 問題出題中（スピードラウンド中を含む）かどうかをチェック
+        if self.game_manager.is_question_active(game_guild_id):
+            await ctx.send("現在問題が出題中です。回答時間が終了するまでお待ちください。", delete_after=5.0)
+            return
+        
         # 回答時間終了後で正解未発表の状態かどうかをチェック
         if self.game_manager.is_waiting_for_answer(game_guild_id):
             await ctx.send("回答時間が終了しました。正解を発表してから次の問題を出題してください。", delete_after=5.0)
@@ -188,6 +231,8 @@ class CommandHandler:
             game_channel = game_guild.get_channel(self.game_channel_id) if game_guild else None
         else:
             game_channel = ctx.channel
+        if self.trace_recorder:
+            game_channel = self.trace_recorder.wrap_channel(game_channel)
         
         if not game_channel:
             await ctx.send("ゲームチャンネルが見つかりません。")
@@ -210,6 +255,44 @@ class CommandHandler:
             # コマンドボタンを更新
             await self.update_command_buttons(ctx.guild.id)
     
+    async def handle_speed_command(self, ctx):
+        """/speedコマンドの処理（スピードラウンドを開始）"""
+        # コマンドサーバー権限チェック
+        if not await self.check_guild_permission(ctx, self.command_guild_id, "コマンド"):
+            return
+        
+        # コマンドチャンネル権限チェック
+        if not await self.check_channel_permission(ctx, self.command_channel_id, "コマンド"):
+            return
+        
+        # ゲームサーバーIDを取得
+        game_guild_id = self.game_guild_id or ctx.guild.id
+        
+        if not self.game_manager.get_game_state(game_guild_id):
+            await ctx.send("現在アクティブなゲームはありません。/start で開始してください。", delete_after=5.0)
+            return
+        
+        if self.game_manager.is_question_active(game_guild_id) or self.game_manager.is_waiting_for_answer(game_guild_id):
+            await ctx.send("現在の問題が終わってからスピードラウンドを開始してください。", delete_after=5.0)
+            return
+        
+        game_channel = self.get_game_channel(ctx)
+        if not game_channel:
+            await ctx.send("ゲームチャンネルが見つかりません。")
+            return
+        
+        # スピードラウンドを開始（以降の出題・正解発表は自動で行われる）
+        if await self.game_manager.start_speed_rounds(game_guild_id, game_channel):
+            await ctx.send("スピードラウンドを開始しました。", delete_after=5.0)
+        else:
+            await ctx.send("スピードラウンドを開始できませんでした。残りの問題がありません。", delete_after=5.0)
+        
+        # 元のメッセージを削除
+        try:
+            await ctx.message.delete()
+        except:
+            pass  # 削除できない場合は無視
+    
     async def handle_answer_command(self, ctx):
         """/answerコマンドの処理"""
         # コマンドサーバー権限チェック
@@ -229,16 +312,16 @@ class CommandHandler:
         
         game_state = self.game_manager.get_game_state(game_guild_id)
         
+        if game_state.get("speed_running"):
+            await ctx.send("スピードラウンド中は正解が自動で発表されます。", delete_after=5.0)
+            return
+        
         if game_state["current_song_id"] is None:
             await ctx.send("現在出題中の問題はありません。", delete_after=5.0)
             return
         
-        # 正解情報を取得
-        correct_title = game_state.get("correct_answer_title", "不明")
-        correct_artist = game_state.get("correct_answer_artist", "不明")
-        
-        # 正解発表をコンソールに出力
-        self.game_manager.log_answer(game_guild_id, correct_title, correct_artist)
+        # 正解情報を取得し、ゲーム状態を更新（次の問題の準備）
+        correct_title, correct_artist = await self.game_manager.reveal_answer(game_guild_id)
         
         # 正解メッセージを作成
         answer_msg = f"**正解発表！**\n"
@@ -248,10 +331,6 @@ class CommandHandler:
         # ゲームチャンネルに正解を送信
         await self.send_to_game_channel(ctx, answer_msg)
         
-        # 正解発表後にゲーム状態を更新（次の問題の準備）
-        game_state["current_song_id"] = None
-        game_state["question_sent"] = False
-        
         # コマンドボタンを再表示
         command_view = self.create_command_buttons()
         await ctx.send("正解をゲームチャンネルに送信しました。コマンドボタンを使用してください。", view=command_view, delete_after=5.0)
@@ -286,36 +365,22 @@ class CommandHandler:
         sorted_scores = sorted(game_state["scores"].items(), key=lambda item: item[1], reverse=True)
         round_num = game_state["round"]
         
+        game_channel = self.get_game_channel(ctx)
+        if not game_channel:
+            await ctx.send("ゲームチャンネルが見つかりません。", delete_after=5.0)
+            return
+        
         if game_state.get("game_ended"):
-            ranking_msg = "**--- 最終順位 ---**\n"
-            rank = 1
-            prev_score = -1
-            for i, (user_id, score) in enumerate(sorted_scores):
-                try:
-                    user = await self.bot.fetch_user(user_id)
-                    if score < prev_score:
-                        rank = i + 1
-                    ranking_msg += f"{rank}位: {user.display_name} ({score}点)\n"
-                    prev_score = score
-                except Exception:
-                    ranking_msg += f"{rank}位: ユーザーID:{user_id} ({score}点)\n"
-                    prev_score = score
-            await self.send_to_game_channel(ctx, ranking_msg)
+            await self.scoreboard.publish(game_guild_id, game_channel, sorted_scores, final=True)
             await self.game_manager.log_score(game_guild_id, sorted_scores, ended=True, round_num=round_num)
             self.game_manager.end_game(game_guild_id)
+            self.scoreboard.end_game(game_guild_id)
             
             # コマンドボタンを再表示
             command_view = self.create_command_buttons()
             await ctx.send("最終結果をゲームチャンネルに送信しました。コマンドボタンを使用してください。", view=command_view, delete_after=5.0)
         else:
-            scoreboard_msg = "**--- 現在のスコア ---**\n"
-            for user_id, score in sorted_scores:
-                try:
-                    user = await self.bot.fetch_user(user_id)
-                    scoreboard_msg += f"{user.display_name}: {score}点\n"
-                except Exception:
-                    scoreboard_msg += f"ユーザーID:{user_id}: {score}点\n"
-            await self.send_to_game_channel(ctx, scoreboard_msg)
+            await self.scoreboard.publish(game_guild_id, game_channel, sorted_scores)
             await self.game_manager.log_score(game_guild_id, sorted_scores, ended=False, round_num=round_num)
             
             # コマンドボタンを再表示
@@ -331,6 +396,28 @@ class CommandHandler:
         # コマンドボタンを更新
         await self.update_command_buttons(ctx.guild.id)
     
+    async def handle_diag_command(self, ctx):
+        """/diagコマンドの処理（管理者のみ）"""
+        # コマンドサーバー権限チェック
+        if not await self.check_guild_permission(ctx, self.command_guild_id, "コマンド"):
+            return
+        
+        # コマンドチャンネル権限チェック
+        if not await self.check_channel_permission(ctx, self.command_channel_id, "コマンド"):
+            return
+        
+        if not self.is_admin(ctx.author):
+            await ctx.send("このコマンドは管理者のみ実行できます。", delete_after=5.0)
+            return
+        
+        await ctx.send(self.create_diagnostics_report(), delete_after=60.0)
+        
+        # 元のメッセージを削除
+        try:
+            await ctx.message.delete()
+        except:
+            pass  # 削除できない場合は無視
+    
     async def update_command_buttons(self, guild_id):
         """コマンドチャンネルのボタンを更新"""
         if self.command_guild_id is None or self.command_channel_id is None:
@@ -0,0 +1,150 @@
+import asyncio
+import datetime
+import logging
+import sys
+import tracemalloc
+from collections import deque
+
+class LoopMonitor:
+    """イベントループの遅延を監視する常駐タスク
+
+    interval秒ごとに1回だけ起床し、予定時刻からの遅れ（ループ遅延）を測る。
+    待機中はタイマー1つ分のコストしかかからないため、本番環境で常時動かせる。
+    遅延がslow_threshold秒を超えた場合と、asyncioのデバッグモードが出す
+    遅いコールバックの警告は、直近history件まで保持する。
+    """
+
+    def __init__(self, interval=1.0, slow_threshold=0.1, history=20):
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.samples = 0
+        self.slow_events = deque(maxlen=history)  # [(時刻, 内容), ...]
+        self.task = None
+        self._log_handler = None
+
+    def start(self, loop_debug=False):
+        """監視を開始（開始済みの場合は何もしない）"""
+        if self.task and not self.task.done():
+            return
+        loop = asyncio.get_running_loop()
+        if loop_debug:
+            # デバッグモードではslow_threshold秒を超えたコールバックをasyncioが警告する
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.slow_threshold
+        if self._log_handler is None:
+            self._log_handler = _SlowCallbackHandler(self)
+            logging.getLogger('asyncio').addHandler(self._log_handler)
+        self.task = asyncio.create_task(self._run(), name="loop_monitor")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - scheduled)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.samples += 1
+            if lag >= self.slow_threshold:
+                self.add_slow_event(f"ループ遅延 {lag * 1000:.0f}ms")
+
+    def add_slow_event(self, text):
+        self.slow_events.append((datetime.datetime.now().strftime('%H:%M:%S'), text))
+
+class _SlowCallbackHandler(logging.Handler):
+    """asyncioの「Executing ... took ... seconds」警告を記録するハンドラー"""
+
+    def __init__(self, monitor):
+        super().__init__(level=logging.WARNING)
+        self.monitor = monitor
+
+    def emit(self, record):
+        message = record.getMessage()
+        if message.startswith("Executing"):
+            self.monitor.add_slow_event(message[:200])
+
+def deep_sizeof(obj, seen=None):
+    """コンテナの中身も含めたおおよそのメモリ使用量（バイト）"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, '__slots__'):
+        size += sum(deep_sizeof(getattr(obj, name), seen) for name in obj.__slots__ if hasattr(obj, name))
+    elif hasattr(obj, '__dict__'):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+def task_summary():
+    """未完了のasyncioタスク数と、そのうちのラウンドタイマー数"""
+    tasks = [task for task in asyncio.all_tasks() if not task.done()]
+    timers = sum(1 for task in tasks if task.get_name().startswith("round_timer"))
+    return len(tasks), timers
+
+TRACEMALLOC_WINDOW = 10.0  # メモリ割り当てを計測する秒数
+tracemalloc_task = None  # 計測中のタスク
+tracemalloc_result = None  # 前回の計測結果
+
+def snapshot_lines(snapshot, limit):
+    """スナップショットから割り当ての上位limit件を行のリストにする"""
+    snapshot = snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+    lines = []
+    for stat in snapshot.statistics('lineno')[:limit]:
+        frame = stat.traceback[0]
+        lines.append(f"{frame.filename.rsplit('/', 1)[-1]}:{frame.lineno} {stat.size / 1024:.1f}KiB ({stat.count}件)")
+    return lines or ["割り当てはありません。"]
+
+async def trace_allocations(window, limit):
+    """window秒だけ計測し、スナップショットを取って計測を終了する"""
+    global tracemalloc_result
+    try:
+        await asyncio.sleep(window)
+        tracemalloc_result = snapshot_lines(tracemalloc.take_snapshot(), limit)
+    finally:
+        # キャンセルされた場合も計測は必ず止める
+        tracemalloc.stop()
+
+def tracemalloc_report(limit=5, window=TRACEMALLOC_WINDOW):
+    """メモリ割り当ての計測（window秒で自動的に終了し、次の実行で上位を表示）"""
+    global tracemalloc_task, tracemalloc_result
+    if tracemalloc_task is not None and not tracemalloc_task.done():
+        return [f"計測中です（{window:.0f}秒間）。終了後にもう一度実行すると上位の割り当てを表示します。"]
+    if tracemalloc_result is not None:
+        lines, tracemalloc_result = tracemalloc_result, None
+        return lines
+    if tracemalloc.is_tracing():
+        return ["他の処理が計測中のため開始できません。"]
+    tracemalloc.start()
+    tracemalloc_task = asyncio.ensure_future(trace_allocations(window, limit))
+    return [f"メモリ割り当ての計測を開始しました（{window:.0f}秒後に自動で終了します）。終了後にもう一度実行すると上位の割り当てを表示します。"]
+
+def format_report(monitor, game_manager):
+    """診断結果のメッセージを作成"""
+    msg = "**--- 診断 ---**\n"
+    if monitor and monitor.task:
+        msg += f"ループ遅延: 直近 {monitor.last_lag * 1000:.1f}ms / 最大 {monitor.max_lag * 1000:.1f}ms（{monitor.samples}回計測）\n"
+    else:
+        msg += "ループ遅延: 監視していません\n"
+    tasks, timers = task_summary()
+    msg += f"asyncioタスク: {tasks}件（ラウンドタイマー {timers}件）\n"
+    msg += f"進行中のゲーム: {len(game_manager.active_games)}件\n"
+    for guild_id, game_state in game_manager.active_games.items():
+        msg += f"  サーバーID:{guild_id} 第{game_state['round']}ラウンド 参加者{len(game_state['scores'])}人 {deep_sizeof(game_state) / 1024:.1f}KiB\n"
+    msg += "メモリ割り当て上位:\n"
+    for line in tracemalloc_report():
+        msg += f"  {line}\n"
+    msg += "遅いコールバックの警告:\n"
+    if monitor and monitor.slow_events:
+        for at, text in list(monitor.slow_events)[-5:]:
+            msg += f"  [{at}] {text}\n"
+    else:
+        msg += "  なし\n"
+    return msg[:2000]
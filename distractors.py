@@ -0,0 +1,134 @@
+import os
+import zlib
+import hashlib
+from collections import Counter
+import numpy as np
+from title_index import normalize
+
+class DistractorIndex:
+    """曲名・アーティスト名の文字n-gram特徴量による類似曲検索
+
+    n-gramはdims次元（既定は2^20）にハッシュするため、別のn-gramが同じ次元に
+    入ることはほぼない。カタログ全体の特徴量行列（曲数×dims, L2正規化済み）は
+    ほとんどが0のため、0でない要素だけを次元の昇順に並べた疎行列
+    （次元・行番号・重みの配列）として一度だけ作成する。
+    メモリは0でない要素1つあたり12バイト（1曲あたり曲名・アーティスト名の
+    n-gram数×12バイト程度、10万曲で約25MB）で、次元数には依存しない。
+    類似度はクエリのn-gramごとに該当する次元の要素を加算して全曲分を計算する。
+    行列はカタログ内容のハッシュと一緒にnpzファイルへ保存し、
+    カタログが変わっていなければ次回起動時はそのまま読み込む。
+    """
+
+    def __init__(self, songs, dims=2 ** 20, cache_path=None, artist_weight=0.5):
+        """songs: (id, title, artist) のリスト"""
+        self.dims = dims
+        self.artist_weight = artist_weight  # アーティスト類似度の重み（曲名類似度は1）
+        self.ids = [row[0] for row in songs]
+        self.titles = [row[1] for row in songs]
+        self.artists = [row[2] or "" for row in songs]
+        self.normalized_titles = np.array([normalize(t) for t in self.titles])
+        self.cache_key = self._catalog_key()
+        if not (cache_path and self._load_cache(cache_path)):
+            self.title_matrix = self._vectorize(self.titles)
+            self.artist_matrix = self._vectorize(self.artists)
+            if cache_path:
+                self._save_cache(cache_path)
+
+    def _catalog_key(self):
+        digest = hashlib.sha1(str(self.dims).encode())
+        for song_id, title, artist in zip(self.ids, self.titles, self.artists):
+            digest.update(f"{song_id}\t{title}\t{artist}\n".encode('utf-8'))
+        return digest.hexdigest()
+
+    def _load_cache(self, cache_path):
+        if not os.path.exists(cache_path):
+            return False
+        try:
+            with np.load(cache_path) as data:
+                if str(data["key"]) != self.cache_key:
+                    return False
+                self.title_matrix = tuple(data[f"title_{name}"] for name in ("buckets", "rows", "weights"))
+                self.artist_matrix = tuple(data[f"artist_{name}"] for name in ("buckets", "rows", "weights"))
+            return True
+        except Exception as e:
+            print(f"類似度キャッシュ読み込みエラー: {e}")
+            return False
+
+    def _save_cache(self, cache_path):
+        try:
+            # np.savezは拡張子を補完するため、書き込み中のファイル名も.npzで終える
+            tmp_path = cache_path + ".tmp.npz"
+            arrays = {}
+            for prefix, matrix in (("title", self.title_matrix), ("artist", self.artist_matrix)):
+                for name, array in zip(("buckets", "rows", "weights"), matrix):
+                    arrays[f"{prefix}_{name}"] = array
+            np.savez(tmp_path, key=np.array(self.cache_key), **arrays)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            print(f"類似度キャッシュ保存エラー: {e}")
+
+    def _features(self, text):
+        """正規化した文字列の2-gram・3-gramをハッシュして次元に割り当てる"""
+        norm = normalize(text)
+        buckets = []
+        for n in (2, 3):
+            if len(norm) < n:
+                if norm:
+                    buckets.append(zlib.crc32(norm.encode('utf-8')) % self.dims)
+                continue
+            for i in range(len(norm) - n + 1):
+                buckets.append(zlib.crc32(norm[i:i + n].encode('utf-8')) % self.dims)
+        return buckets
+
+    def _vectorize(self, texts):
+        """疎行列 (次元, 行番号, 重み) を作成（L2正規化済み、次元・行番号の昇順）"""
+        count = len(texts)
+        keys = [bucket * count + row for row, text in enumerate(texts) for bucket in self._features(text)]
+        # 同じ行・次元の重複はまとめて回数を重みにする
+        keys, counts = np.unique(np.array(keys, dtype=np.int64), return_counts=True)
+        buckets = (keys // max(count, 1)).astype(np.int32)
+        rows = (keys % max(count, 1)).astype(np.int32)
+        weights = counts.astype(np.float32)
+        norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=count)).astype(np.float32)
+        norms[norms == 0] = 1.0
+        weights /= norms[rows]
+        return buckets, rows, weights
+
+    def _scores(self, matrix, text):
+        """全曲とのコサイン類似度"""
+        buckets, rows, weights = matrix
+        scores = np.zeros(len(self.titles), dtype=np.float32)
+        features = Counter(self._features(text))
+        norm = np.sqrt(sum(c * c for c in features.values()))
+        for bucket, c in features.items():
+            lo, hi = np.searchsorted(buckets, [bucket, bucket + 1])
+            # 1つの次元に同じ行は1回しか現れないため、そのまま加算できる
+            scores[rows[lo:hi]] += weights[lo:hi] * (c / norm)
+        return scores
+
+    def similar_titles(self, title, artist=None, k=3):
+        """曲名またはアーティスト名が似ている別の曲名をk件返す"""
+        if not self.titles:
+            return []
+        scores = self._scores(self.title_matrix, title)
+        if artist:
+            scores += self.artist_weight * self._scores(self.artist_matrix, artist)
+        # 正解と同じ曲名は候補から除外
+        scores[self.normalized_titles == normalize(title)] = -np.inf
+        # 同名曲の重複を考慮して多めに取り出してから上位を並べ替える
+        candidates = min(len(scores), k * 4)
+        top = np.argpartition(-scores, candidates - 1)[:candidates]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        seen = set()
+        for index in top:
+            if scores[index] <= 0:
+                break  # 似ていない曲は返さない（残りは呼び出し側でランダムに選ぶ）
+            norm = self.normalized_titles[index]
+            if norm in seen:
+                continue
+            seen.add(norm)
+            results.append(self.titles[index])
+            if len(results) >= k:
+                break
+        return results
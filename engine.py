@@ -0,0 +1,173 @@
+"""ゲームエンジンプロセス
+
+python engine.py --config 設定ファイル
+
+ゲームの状態管理・採点・出題タイマー・音声ファイルの準備をDiscordの
+ゲートウェイとは別のプロセスで動かす。ゲートウェイ（engine_socketを設定した
+main.py）とはUnixソケットで通信し、Discordへの送信はゲートウェイに依頼する。
+"""
+import argparse
+import asyncio
+import configparser
+import os
+from types import SimpleNamespace
+from game_manager import GameManager
+from result_store import ResultStore
+from engine_protocol import Connection, snapshot_state
+from quiz_pack import ClipReader
+
+class EngineBot:
+    """GameManagerが参照するbotの代わり（ユーザー名はゲートウェイから受け取ったものを使う）"""
+
+    def __init__(self):
+        self.names = {}  # {user_id: 表示名}
+
+    def remember(self, user_id, display_name):
+        if display_name:
+            self.names[user_id] = display_name
+
+    def get_user(self, user_id):
+        if user_id not in self.names:
+            return None
+        return SimpleNamespace(id=user_id, display_name=self.names[user_id])
+
+    async def fetch_user(self, user_id):
+        user = self.get_user(user_id)
+        if user is None:
+            raise LookupError(f"ユーザー名が不明です: {user_id}")
+        return user
+
+class RemoteChannel:
+    """ゲートウェイ経由でメッセージを送信するチャンネル"""
+
+    def __init__(self, connection, channel_id):
+        self.connection = connection
+        self.id = channel_id
+
+    async def send(self, content=None, file=None, view=None):
+        data = {"c": self.id, "text": content}
+        if file is not None:
+            # 音声ファイルは同じホスト上のパスで渡し、アップロードはゲートウェイが行う
+            if isinstance(file.fp, ClipReader):
+                data["clip"] = [file.fp.pack.path, file.fp.round_index]
+            else:
+                data["file"] = os.path.abspath(file.fp.name)
+            data["filename"] = file.filename
+            file.close()
+        if view is not None:
+            data["opts"] = [[item.label, item.custom_id] for item in view.children]
+        await self.connection.request("send", **data)
+
+class EngineServer:
+    """ゲートウェイからの要求をGameManagerに渡す"""
+
+    def __init__(self, game_manager, bot):
+        self.game_manager = game_manager
+        self.bot = bot
+        self.connections = set()
+
+    async def on_connect(self, reader, writer):
+        connection = Connection(reader, writer, self.handle).start()
+        self.connections.add(connection)
+        print(f"ゲートウェイが接続しました（接続数: {len(self.connections)}）")
+        await connection.closed.wait()
+        self.connections.discard(connection)
+        print(f"ゲートウェイが切断しました（接続数: {len(self.connections)}）")
+
+    async def update_command_buttons(self, guild_id):
+        """ゲーム状態の変化を全ゲートウェイに通知（GameManager.command_handlerとして呼ばれる）"""
+        state = snapshot_state(self.game_manager.get_game_state(guild_id))
+        # 1つのゲートウェイの切断・遅延が他のゲートウェイへの通知を妨げないよう個別に送る
+        results = await asyncio.gather(*(connection.notify("buttons", g=guild_id, state=state) for connection in list(self.connections)),
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"ゲートウェイへの通知エラー: {result}")
+
+    def reply(self, guild_id, result=None):
+        return {"result": result, "state": snapshot_state(self.game_manager.get_game_state(guild_id))}
+
+    async def handle(self, connection, message):
+        op = message.get("op")
+        guild_id = message.get("g")
+        game_manager = self.game_manager
+        if "u" in message:
+            self.bot.remember(message["u"], message.get("n"))
+
+        if op == "start_game":
+            members = []
+            for user_id, name in message["members"]:
+                self.bot.remember(user_id, name)
+                members.append(SimpleNamespace(id=user_id, display_name=name, bot=False))
+            await game_manager.start_game(guild_id, members)
+            return self.reply(guild_id)
+        if op == "next_question":
+            game_state = game_manager.get_game_state(guild_id)
+            if not game_state:
+                return self.reply(guild_id, False)
+            success = await game_manager.next_question(guild_id, RemoteChannel(connection, message["c"]), game_state)
+            return self.reply(guild_id, success)
+        if op == "submit_answer":
+            result = await game_manager.submit_answer(guild_id, message["u"], message["a"])
+            return self.answer_reply(guild_id, message["u"], result)
+        if op == "submit_typed_answer":
+            result = await game_manager.submit_typed_answer(guild_id, message["u"], message["text"])
+            return self.answer_reply(guild_id, message["u"], result)
+        if op == "start_speed_rounds":
+            success = await game_manager.start_speed_rounds(guild_id, RemoteChannel(connection, message["c"]))
+            return self.reply(guild_id, success)
+        if op == "reveal_answer":
+            result = await game_manager.reveal_answer(guild_id)
+            return self.reply(guild_id, list(result) if result else None)
+        if op == "log_score":
+            await game_manager.log_score(guild_id, message["scores"], ended=message["ended"], round_num=message.get("round"))
+            return self.reply(guild_id)
+        if op == "end_game":
+            game_manager.end_game(guild_id)
+            return self.reply(guild_id)
+        if op == "state":
+            return self.reply(guild_id)
+        if op == "warm_up":
+            await game_manager.warm_up()
+            return None
+        raise ValueError(f"不明な操作です: {op}")
+
+    def answer_reply(self, guild_id, user_id, result):
+        """回答の応答（全員分のスコアは送らず、回答者のスコアだけを返す）"""
+        game_state = self.game_manager.get_game_state(guild_id)
+        score = game_state["scores"].get(user_id) if game_state else None
+        return {"result": result, "score": score}
+
+async def run_engine(game_manager, bot, socket_path):
+    server = EngineServer(game_manager, bot)
+    game_manager.command_handler = server
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    unix_server = await asyncio.start_unix_server(server.on_connect, path=socket_path)
+    print(f"ゲームエンジンを起動しました: {socket_path}")
+    asyncio.create_task(game_manager.warm_up())
+    async with unix_server:
+        await unix_server.serve_forever()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='ゲームエンジンプロセス')
+    parser.add_argument('--config', type=str, default='config.ini', help='設定ファイル(.ini)のパス')
+    args = parser.parse_args()
+
+    config_ini = configparser.ConfigParser()
+    config_ini.read(args.config, encoding='utf-8')
+
+    DB_PATH = config_ini.get('DEFAULT', 'db_path', fallback='songs.db')
+    song_ids_str = config_ini.get('DEFAULT', 'song_ids', fallback=None)
+    SONG_IDS = [int(s.strip()) for s in song_ids_str.split(',')] if song_ids_str else None
+    ROUNDS = config_ini.getint('DEFAULT', 'rounds', fallback=5)
+    LOG_PATH = config_ini.get('DEFAULT', 'log_path', fallback='score_log.txt')
+    ANSWER_SECONDS = config_ini.getint('DEFAULT', 'answer_seconds', fallback=15)
+    RESULTS_DB_PATH = config_ini.get('DEFAULT', 'results_db_path', fallback=None)
+    RANDOM_SEED = config_ini.getint('DEFAULT', 'random_seed', fallback=None)
+    ENGINE_SOCKET = config_ini.get('DEFAULT', 'engine_socket', fallback='./musicquiz_engine.sock')
+
+    bot = EngineBot()
+    result_store = ResultStore(RESULTS_DB_PATH) if RESULTS_DB_PATH else None
+    game_manager = GameManager(bot, config_ini, DB_PATH, LOG_PATH, ROUNDS, SONG_IDS, ANSWER_SECONDS, result_store=result_store, seed=RANDOM_SEED)
+    asyncio.run(run_engine(game_manager, bot, ENGINE_SOCKET))
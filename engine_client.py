@@ -0,0 +1,133 @@
+import asyncio
+import contextlib
+import discord
+from game_manager import GameManager
+from engine_protocol import Connection, restore_state
+from quiz_pack import QuizPack
+
+class RemoteGameManager:
+    """別プロセスのゲームエンジンを操作するGameManagerの代わり（ゲートウェイ側）
+
+    main.py・CommandHandlerからはGameManagerと同じように使える。
+    状態の判定（is_game_activeなど）は、エンジンから応答・通知のたびに
+    受け取るゲーム状態の写しで行うため、エンジンへの問い合わせは発生しない。
+    """
+
+    # 状態の判定はGameManagerと同じ処理を写しに対して行う
+    get_game_state = GameManager.get_game_state
+    is_question_active = GameManager.is_question_active
+    is_waiting_for_answer = GameManager.is_waiting_for_answer
+    is_game_active = GameManager.is_game_active
+
+    def __init__(self, bot, config_ini, socket_path, command_handler=None):
+        self.bot = bot
+        self.socket_path = socket_path
+        self.command_handler = command_handler
+        self.answer_mode = config_ini.get('DEFAULT', 'answer_mode', fallback='buttons').strip()
+        self.active_games = {}  # エンジン側のゲーム状態の写し {game_guild_id: {...}}
+        self.connection = None
+        self.trace_recorder = None  # トレース記録（main.pyで設定）
+        self.quiz_packs = {}  # エンジンから指定されたクイズパック {パス: QuizPack}
+        self._connect_lock = asyncio.Lock()
+
+    async def connect(self):
+        """エンジンに接続（接続済みの場合は何もしない）"""
+        async with self._connect_lock:
+            if self.connection and not self.connection.closed.is_set():
+                return
+            reader, writer = await asyncio.open_unix_connection(self.socket_path)
+            self.connection = Connection(reader, writer, self.handle).start()
+            print(f"ゲームエンジンに接続しました: {self.socket_path}")
+
+    async def request(self, op, guild_id, **data):
+        await self.connect()
+        reply = await self.connection.request(op, g=guild_id, **data)
+        if "state" in reply:
+            self.apply_state(guild_id, reply["state"])
+        return reply
+
+    def apply_state(self, guild_id, snapshot):
+        game_state = restore_state(snapshot)
+        if game_state is None:
+            self.active_games.pop(guild_id, None)
+        else:
+            self.active_games[guild_id] = game_state
+
+    def user_name(self, user_id):
+        user = self.bot.get_user(user_id)
+        return user.display_name if user else None
+
+    async def handle(self, connection, message):
+        """エンジンからの要求・通知の処理"""
+        if message.get("ev") == "buttons":
+            self.apply_state(message["g"], message["state"])
+            if self.command_handler:
+                await self.command_handler.update_command_buttons(message["g"])
+            return None
+        if message.get("op") == "send":
+            channel = self.bot.get_channel(message["c"])
+            if channel is None:
+                raise LookupError(f"チャンネルが見つかりません: {message['c']}")
+            if self.trace_recorder:
+                channel = self.trace_recorder.wrap_channel(channel)
+            kwargs = {}
+            if message.get("file"):
+                kwargs["file"] = discord.File(message["file"], filename=message.get("filename"))
+            elif message.get("clip"):
+                # クイズパックの音声はゲートウェイ側でも同じパックをmmapして送信する
+                pack_path, round_index = message["clip"]
+                if pack_path not in self.quiz_packs:
+                    self.quiz_packs[pack_path] = QuizPack(pack_path)
+                kwargs["file"] = discord.File(self.quiz_packs[pack_path].open_clip(round_index), filename=message.get("filename"))
+            if message.get("opts"):
+                view = discord.ui.View()
+                for label, custom_id in message["opts"]:
+                    view.add_item(discord.ui.Button(label=label, style=discord.ButtonStyle.primary, custom_id=custom_id))
+                kwargs["view"] = view
+            await channel.send(message.get("text"), **kwargs)
+            return None
+        raise ValueError(f"不明な要求です: {message}")
+
+    async def warm_up(self, profiler=None):
+        """エンジンに接続し、エンジン側のウォームアップ完了を待つ"""
+        with profiler.phase("エンジン接続・ウォームアップ") if profiler else contextlib.nullcontext():
+            await self.connect()
+            await self.connection.request("warm_up")
+    
+    async def start_game(self, guild_id, members):
+        members = [[m.id, m.display_name] for m in members if not m.bot]
+        await self.request("start_game", guild_id, members=members)
+
+    async def next_question(self, game_guild_id, game_channel, game_state):
+        reply = await self.request("next_question", game_guild_id, c=game_channel.id)
+        return reply["result"]
+
+    async def start_speed_rounds(self, game_guild_id, game_channel):
+        reply = await self.request("start_speed_rounds", game_guild_id, c=game_channel.id)
+        return reply["result"]
+
+    async def submit_answer(self, guild_id, user_id, selected_answer):
+        reply = await self.request("submit_answer", guild_id, u=user_id, n=self.user_name(user_id), a=selected_answer)
+        self.apply_score(guild_id, user_id, reply)
+        return reply["result"]
+
+    async def submit_typed_answer(self, guild_id, user_id, text):
+        reply = await self.request("submit_typed_answer", guild_id, u=user_id, n=self.user_name(user_id), text=text)
+        self.apply_score(guild_id, user_id, reply)
+        return reply["result"]
+
+    def apply_score(self, guild_id, user_id, reply):
+        game_state = self.active_games.get(guild_id)
+        if game_state is not None and reply.get("score") is not None:
+            game_state["scores"][user_id] = reply["score"]
+
+    async def reveal_answer(self, guild_id):
+        reply = await self.request("reveal_answer", guild_id)
+        return tuple(reply["result"]) if reply["result"] else None
+
+    async def log_score(self, guild_id, sorted_scores, ended=False, round_num=None):
+        await self.request("log_score", guild_id, scores=[list(item) for item in sorted_scores], ended=ended, round=round_num)
+
+    def end_game(self, guild_id):
+        self.active_games.pop(guild_id, None)
+        asyncio.create_task(self.request("end_game", guild_id))
@@ -0,0 +1,89 @@
+"""ゲームエンジンの負荷試験
+
+python engine_loadtest.py --config 設定ファイル [--players 人数] [--rounds ラウンド数]
+
+Discordに接続せず、ゲートウェイの代わりにエンジン（engine.py）へ接続して
+ゲームを1回実行する。各ラウンドで全プレイヤーが同時に回答し、
+操作ごとの応答時間を集計して表示する。
+"""
+import argparse
+import asyncio
+import configparser
+import random
+import statistics
+import time
+from collections import defaultdict
+from engine_protocol import Connection
+
+class StandInGateway:
+    """エンジンからの送信依頼を受け取るだけのゲートウェイの代わり"""
+
+    def __init__(self):
+        self.sent = 0
+        self.options = None
+        self.options_ready = asyncio.Event()
+        self.round_closed = asyncio.Event()
+        self.timings = defaultdict(list)
+
+    async def handle(self, connection, message):
+        if message.get("op") == "send":
+            self.sent += 1
+            if message.get("opts"):
+                self.options = [custom_id for label, custom_id in message["opts"]]
+                self.options_ready.set()
+            return None
+        if message.get("ev") == "buttons":
+            state = message.get("state")
+            if state and state["question_sent"] and state["answering_lock"]:
+                self.round_closed.set()
+            return None
+        raise ValueError(f"不明な要求です: {message}")
+
+    async def timed(self, connection, op, **data):
+        started_at = time.perf_counter()
+        reply = await connection.request(op, **data)
+        self.timings[op].append((time.perf_counter() - started_at) * 1000)
+        return reply
+
+async def run_loadtest(socket_path, guild_id, channel_id, players, rounds):
+    gateway = StandInGateway()
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    connection = Connection(reader, writer, gateway.handle).start()
+    members = [[user_id, f"player{user_id}"] for user_id in range(1, players + 1)]
+    started_at = time.perf_counter()
+    await gateway.timed(connection, "start_game", g=guild_id, members=members)
+    for round_num in range(rounds):
+        gateway.options_ready.clear()
+        gateway.round_closed.clear()
+        reply = await gateway.timed(connection, "next_question", g=guild_id, c=channel_id)
+        if not reply["result"]:
+            print(f"第{round_num + 1}ラウンドの出題に失敗しました")
+            break
+        await gateway.options_ready.wait()
+        answers = [gateway.timed(connection, "submit_answer", g=guild_id, u=user_id, a=random.choice(gateway.options).replace("introdon_answer_", ""))
+                   for user_id, name in members]
+        await asyncio.gather(*answers)
+        await gateway.round_closed.wait()
+        await gateway.timed(connection, "reveal_answer", g=guild_id)
+    await gateway.timed(connection, "end_game", g=guild_id)
+    elapsed = time.perf_counter() - started_at
+    connection.close()
+
+    print(f"=== 負荷試験結果（{players}人, {rounds}ラウンド, {elapsed:.2f}秒, 送信依頼 {gateway.sent}件） ===")
+    for op, values in gateway.timings.items():
+        ordered = sorted(values)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        print(f"  {op}: {len(values)}件 中央値 {statistics.median(values):.2f}ms p95 {p95:.2f}ms 最大 {ordered[-1]:.2f}ms")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='ゲームエンジンの負荷試験')
+    parser.add_argument('--config', type=str, default='config.ini', help='設定ファイル(.ini)のパス')
+    parser.add_argument('--players', type=int, default=100, help='同時に回答するプレイヤー数')
+    parser.add_argument('--rounds', type=int, default=3, help='ラウンド数')
+    parser.add_argument('--guild-id', type=int, default=1, help='試験用のサーバーID（本番と重ならない値）')
+    args = parser.parse_args()
+
+    config_ini = configparser.ConfigParser()
+    config_ini.read(args.config, encoding='utf-8')
+    ENGINE_SOCKET = config_ini.get('DEFAULT', 'engine_socket', fallback='./musicquiz_engine.sock')
+    asyncio.run(run_loadtest(ENGINE_SOCKET, args.guild_id, 0, args.players, args.rounds))
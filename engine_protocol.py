@@ -0,0 +1,127 @@
+import asyncio
+import json
+import struct
+
+# ゲームエンジンとゲートウェイ間のメッセージ形式
+#
+# 1メッセージ = 4バイト（ビッグエンディアン）の長さ + JSON本体
+#   要求: {"id": 番号, "op": 操作名, ...引数}
+#   応答: {"re": 番号, "ok": 戻り値} または {"re": 番号, "err": エラー内容}
+#   通知: {"ev": 種別, ...}（応答なし）
+# 要求はどちら側からも送れる（エンジン→ゲートウェイはメッセージ送信の依頼など）
+
+_HEADER = struct.Struct('>I')
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+class RemoteError(Exception):
+    """相手側で処理中に発生したエラー"""
+
+class Connection:
+    """1本のUnixソケット接続上で要求・応答・通知をやり取りする"""
+
+    def __init__(self, reader, writer, handler):
+        """handler: async def handler(connection, message) 受信した要求・通知の処理（要求の戻り値が応答になる）"""
+        self.reader = reader
+        self.writer = writer
+        self.handler = handler
+        self.pending = {}  # {番号: Future}
+        self.next_id = 0
+        self.closed = asyncio.Event()
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self._read_loop(), name="engine_connection")
+        return self
+
+    def _write(self, message):
+        body = json.dumps(message, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.writer.write(_HEADER.pack(len(body)) + body)
+
+    async def request(self, op, **data):
+        """要求を送って応答を待つ"""
+        if self.closed.is_set():
+            raise ConnectionError("エンジンとの接続が切断されています")
+        self.next_id += 1
+        request_id = self.next_id
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        self._write({"id": request_id, "op": op, **data})
+        await self.writer.drain()
+        return await future
+
+    async def notify(self, ev, **data):
+        """通知を送る（応答は待たない。切断済みの場合は何もしない）"""
+        if self.closed.is_set():
+            return
+        try:
+            self._write({"ev": ev, **data})
+            await self.writer.drain()
+        except (ConnectionError, OSError):
+            pass  # 切断済みの場合は読み込み側で後処理する
+
+    async def _read_loop(self):
+        try:
+            while True:
+                header = await self.reader.readexactly(_HEADER.size)
+                (length,) = _HEADER.unpack(header)
+                if length > MAX_MESSAGE_SIZE:
+                    raise ConnectionError(f"メッセージが大きすぎます: {length}バイト")
+                message = json.loads(await self.reader.readexactly(length))
+                if "re" in message:
+                    future = self.pending.pop(message["re"], None)
+                    if future and not future.done():
+                        if "err" in message:
+                            future.set_exception(RemoteError(message["err"]))
+                        else:
+                            future.set_result(message.get("ok"))
+                else:
+                    # 要求の処理中も受信を続けられるようにタスクで処理する
+                    asyncio.create_task(self._dispatch(message))
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            pass
+        finally:
+            self.closed.set()
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("エンジンとの接続が切断されました"))
+            self.pending.clear()
+            self.writer.close()
+
+    async def _dispatch(self, message):
+        try:
+            reply = {"ok": await self.handler(self, message)}
+        except Exception as e:
+            reply = {"err": f"{type(e).__name__}: {e}"}
+            if "id" not in message:
+                print(f"エンジン通知の処理エラー: {e}")
+        if "id" in message and not self.closed.is_set():
+            self._write({"re": message["id"], **reply})
+            try:
+                await self.writer.drain()
+            except (ConnectionError, OSError):
+                pass  # 切断済みの場合は読み込み側で後処理する
+
+    def close(self):
+        self.writer.close()
+
+def snapshot_state(game_state):
+    """ゲートウェイ側の判定・スコア表示に必要なゲーム状態を抜き出す"""
+    if game_state is None:
+        return None
+    return {
+        "current_song_id": game_state.get("current_song_id"),
+        "round": game_state.get("round", 0),
+        "answering_lock": game_state.get("answering_lock", True),
+        "question_sent": game_state.get("question_sent", False),
+        "game_ended": game_state.get("game_ended", False),
+        "speed_running": game_state.get("speed_running", False),
+        "scores": list(game_state.get("scores", {}).items()),
+    }
+
+def restore_state(snapshot):
+    """snapshot_stateの結果をゲーム状態の辞書に戻す（JSONで失われたキーの型を復元）"""
+    if snapshot is None:
+        return None
+    game_state = dict(snapshot)
+    game_state["scores"] = {int(user_id): score for user_id, score in snapshot["scores"]}
+    return game_state
@@ -4,9 +4,14 @@ import asyncio
 import configparser
 import datetime
 import random
+import time
+import contextlib
+from title_index import TitleIndex
+from round_stats import RoundAnswers
+from quiz_pack import QuizPack
 
 class GameManager:
-    def __init__(self, bot, config_ini, db_path, log_path, rounds, song_ids, answer_seconds, command_handler=None):
+    def __init__(self, bot, config_ini, db_path, log_path, rounds, song_ids, answer_seconds, command_handler=None, result_store=None, seed=None):
         self.bot = bot
         self.config_ini = config_ini
         self.db_path = db_path
@@ -16,28 +21,168 @@ class GameManager:
         self.answer_seconds = answer_seconds
         self.active_games = {}  # {game_guild_id: {...}}
         self.command_handler = command_handler
+        self.result_store = result_store  # 結果DB（未設定の場合は記録しない）
+        self.answer_mode = config_ini.get('DEFAULT', 'answer_mode', fallback='buttons').strip()  # buttons / typed
+        self.typed_threshold = config_ini.getfloat('DEFAULT', 'typed_threshold', fallback=0.75)
+        self.title_index = None
+        self.option_mode = config_ini.get('DEFAULT', 'option_mode', fallback='random').strip()  # random / hard
+        self.distractor_cache_path = config_ini.get('DEFAULT', 'distractor_cache_path', fallback=f"{db_path}.distractors.npz")
+        self.distractor_index = None
+        self.scoring_mode = config_ini.get('DEFAULT', 'scoring_mode', fallback='normal').strip()  # normal / speed
+        self.speed_bonus = config_ini.getint('DEFAULT', 'speed_bonus', fallback=9)
+        self.scoring_seconds = None  # 得点計算に使う回答時間（Noneの場合はanswer_seconds。リプレイの倍速再生用）
+        self.speed_rounds = config_ini.getint('DEFAULT', 'speed_rounds', fallback=None)  # スピードラウンドの問題数（省略時は残り全問）
+        self.speed_reveal_seconds = config_ini.getfloat('DEFAULT', 'speed_reveal_seconds', fallback=3.0)
+        self.seed = seed
+        self.random = random.Random(seed)  # 出題・選択肢の乱数（シードを固定するとリプレイで再現可能）
+        self.catalog = None
+        self.catalog_titles = None
+        self.ready = False  # ウォームアップ完了済みかどうか
+        self.warm_up_task = None  # 実行中・完了済みのウォームアップ（1回だけ実行する）
+        # クイズパック（設定されている場合は出題データ・音声をパックから読み込み、DBは使わない）
+        quiz_pack_path = config_ini.get('DEFAULT', 'quiz_pack', fallback=None)
+        self.quiz_pack = QuizPack(quiz_pack_path) if quiz_pack_path else None
+        if self.quiz_pack:
+            self.rounds = len(self.quiz_pack)
     
     def get_game_guild_id(self, game_guild_id):
         """ゲームサーバーIDを取得（設定されていない場合はNone）"""
         return game_guild_id
     
-    def generate_options(self, correct_answer: str):
-        """選択肢をDBからランダム生成"""
-        options = [correct_answer]
+    def load_catalog(self):
+        """楽曲カタログ [(id, title, artist), ...] をDB（クイズパック使用時はパック）から取得"""
+        if self.quiz_pack:
+            return self.quiz_pack.catalog
         try:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
-            cursor.execute("SELECT title FROM songs WHERE title != ? ORDER BY RANDOM() LIMIT 3", (correct_answer,))
-            for row in cursor.fetchall():
-                options.append(row[0])
+            cursor.execute("SELECT id, title, artist FROM songs ORDER BY id")
+            catalog = cursor.fetchall()
             conn.close()
         except Exception as e:
             if 'conn' in locals():
                 conn.close()
             raise e
-        random.shuffle(options)
+        return catalog
+    
+    def get_catalog(self):
+        """楽曲カタログを取得（初回のみDBから読み込む）"""
+        if self.catalog is None:
+            # 別スレッドから読み込む場合があるため、2つの属性は揃ってから設定する
+            catalog = self.load_catalog()
+            catalog_titles = list(dict.fromkeys(row[1] for row in catalog))
+            self.catalog_titles, self.catalog = catalog_titles, catalog
+        return self.catalog
+    
+    def get_distractor_index(self):
+        """hardモード用の類似曲インデックスを取得（初回のみ構築、numpyが必要）"""
+        if self.distractor_index is None:
+            from distractors import DistractorIndex
+            self.distractor_index = DistractorIndex(self.get_catalog(), cache_path=self.distractor_cache_path)
+        return self.distractor_index
+    
+    def generate_options(self, correct_answer: str, correct_artist=None):
+        """選択肢をDBから生成（hardモードでは曲名・アーティストが似た曲を優先）"""
+        options = [correct_answer]
+        if self.option_mode == "hard":
+            options += self.get_distractor_index().similar_titles(correct_answer, correct_artist, k=3)
+        if len(options) < 4:
+            self.get_catalog()
+            titles = self.catalog_titles
+            remaining = [t for t in titles if t not in options] if len(titles) <= 16 else None
+            if remaining is not None:
+                # 曲数が少ない場合は残りから直接選ぶ
+                options += self.random.sample(remaining, min(4 - len(options), len(remaining)))
+            else:
+                while len(options) < 4:
+                    title = self.random.choice(titles)
+                    if title not in options:
+                        options.append(title)
+        self.random.shuffle(options)
         return options
     
+    def get_title_index(self):
+        """チャット回答用のタイトルインデックスを取得（初回のみDBから構築）"""
+        if self.title_index is None:
+            self.get_catalog()
+            titles = self.catalog_titles
+            self.title_index = TitleIndex(titles, threshold=self.typed_threshold)
+        return self.title_index
+    
+    def prepare_title_target(self, correct_title):
+        """チャット回答の判定用データを作成（typedモード以外はNone）"""
+        if self.answer_mode != "typed":
+            return None
+        return self.get_title_index().prepare(correct_title)
+    
+    def preload_clips(self):
+        """出題予定の音声ファイルを読み込んでOSのキャッシュに載せる（song_idsが設定されている場合のみ）"""
+        if self.quiz_pack:
+            self.quiz_pack.preload()
+            return len(self.quiz_pack)
+        if not self.song_ids:
+            return 0
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            placeholders = ", ".join("?" for _ in self.song_ids)
+            cursor.execute(f"SELECT path FROM songs WHERE id IN ({placeholders})", self.song_ids)
+            paths = [row[0] for row in cursor.fetchall()]
+            conn.close()
+        except Exception as e:
+            if 'conn' in locals():
+                conn.close()
+            raise e
+        loaded = 0
+        for path in paths:
+            try:
+                self.read_clip(path)
+                loaded += 1
+            except OSError as e:
+                print(f"音声ファイル読み込みエラー: {e}")
+        return loaded
+    
+    @staticmethod
+    def read_clip(path):
+        """音声ファイルを最後まで読んでOSのキャッシュに載せる"""
+        with open(path, 'rb') as f:
+            while f.read(1024 * 1024):
+                pass
+    
+    async def warm_up(self, profiler=None):
+        """カタログ・インデックス・音声ファイルをバックグラウンドで事前に読み込む
+
+        DB読み込みやインデックス構築は別スレッドで行い、イベントループを止めない。
+        同時に呼ばれた場合も読み込みは1回だけ行い、全員がその完了を待つ。
+        """
+        if self.warm_up_task is None:
+            self.warm_up_task = asyncio.ensure_future(self.run_warm_up(profiler))
+        # 呼び出し元がキャンセルされてもウォームアップ自体は続ける
+        await asyncio.shield(self.warm_up_task)
+    
+    async def run_warm_up(self, profiler=None):
+        try:
+            await self.load_for_warm_up(profiler)
+        except Exception:
+            # 失敗した場合は次の呼び出しでやり直す
+            self.warm_up_task = None
+            raise
+        self.ready = True
+    
+    async def load_for_warm_up(self, profiler):
+        loop = asyncio.get_running_loop()
+        phase = profiler.phase if profiler else (lambda name: contextlib.nullcontext())
+        with phase("カタログ読み込み"):
+            await loop.run_in_executor(None, self.get_catalog)
+        if self.answer_mode == "typed":
+            with phase("タイトルインデックス構築"):
+                await loop.run_in_executor(None, self.get_title_index)
+        if self.option_mode == "hard" and not self.quiz_pack:
+            with phase("類似曲インデックス構築"):
+                await loop.run_in_executor(None, self.get_distractor_index)
+        with phase("音声ファイル読み込み"):
+            await loop.run_in_executor(None, self.preload_clips)
+    
     async def start_game(self, guild_id, members):
         """ゲーム開始"""
         self.active_games[guild_id] = {
@@ -45,8 +190,23 @@ class GameManager:
             "scores": {member.id: 0 for member in members if not member.bot},
             "round": 0,
             "answering_lock": True,
-            "question_sent": False
+            "question_sent": False,
+            "round_answers": RoundAnswers(),
+            "round_started_at": None,
+            "game_id": None,
+            "results_stored": False
         }
+        if self.result_store:
+            try:
+                self.active_games[guild_id]["game_id"] = self.result_store.start_game(guild_id, self.rounds)
+            except Exception as e:
+                print(f"結果DB書き込みエラー: {e}")
+        
+        # 最初の出題前にインデックスを構築しておく（起動時のウォームアップが実行中ならその完了を待つ）
+        try:
+            await self.warm_up()
+        except Exception as e:
+            print(f"事前読み込みエラー: {e}")
         
         # ゲーム開始をコンソールに出力
         print(f"=== ゲーム開始 ===")
@@ -57,10 +217,14 @@ class GameManager:
     
     async def next_question(self, game_guild_id, game_channel, game_state):
         """次の問題を出題"""
+        if game_state.get("speed_running"):
+            # スピードラウンド中の出題はrun_speed_roundsが行う
+            return False
         if game_state["round"] >= self.rounds:
             # ゲーム終了処理
             await game_channel.send("**--- クイズ終了！ ---**")
             game_state["game_ended"] = True
+            self.store_final_results(game_state)
             
             # ゲーム終了をコンソールに出力
             print(f"=== ゲーム終了 ===")
@@ -70,41 +234,23 @@ class GameManager:
             
             return False
         
-        try:
-            # 楽曲情報をDBから取得
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            song_info = None
-            if self.song_ids and len(self.song_ids) > game_state["round"]:
-                song_id = self.song_ids[game_state["round"]]
-                cursor.execute("SELECT id, title, artist, path FROM songs WHERE id = ?", (song_id,))
-                song_info = cursor.fetchone()
-            else:
-                cursor.execute("SELECT id, title, artist, path FROM songs ORDER BY RANDOM() LIMIT 1")
-                song_info = cursor.fetchone()
-            if not song_info:
-                await game_channel.send("楽曲が見つかりませんでした。クイズを終了します。")
-                del self.active_games[game_guild_id]
-                conn.close()
-                return False
-            song_id, correct_title, correct_artist, file_path = song_info
+        pack_round = None
+        if self.quiz_pack:
+            # 楽曲情報をクイズパックから取得
+            pack_round = self.quiz_pack.rounds[game_state["round"]]
+            song_id = pack_round["song_id"]
             game_state["current_song_id"] = song_id
-            game_state["correct_answer_artist"] = correct_artist
-            game_state["file_path"] = file_path
-            game_state["answered_users"] = []
+            game_state["correct_answer_title"] = pack_round["title"]
+            game_state["correct_answer_artist"] = pack_round["artist"]
+            game_state["file_path"] = f"{self.quiz_pack.path}#{game_state['round'] + 1}"
+            game_state["round_answers"] = RoundAnswers()
             game_state["question_sent"] = False
-            answer_key = f"answer_{game_state['round']+1}"
-            if self.config_ini.has_option('DEFAULT', answer_key):
-                game_state["correct_answer_title"] = self.config_ini.get('DEFAULT', answer_key).strip()
-            else:
-                game_state["correct_answer_title"] = correct_title
-        except Exception as e:
-            await game_channel.send(f"データベースエラー: {e}")
-            if 'conn' in locals():
-                conn.close()
-            del self.active_games[game_guild_id]
-            return False
-        conn.close()
+        else:
+            if not await self.load_question(game_guild_id, game_channel, game_state):
+                return False
+            song_id = game_state["current_song_id"]
+
+        game_state["title_target"] = self.prepare_title_target(game_state["correct_answer_title"])
 
         # ラウンド開始メッセージ
         await game_channel.send(f"**--- 第{game_state['round']+1}ラウンド ---**")
@@ -118,7 +264,11 @@ class GameManager:
 
         # 音声ファイル送信
         try:
-            await game_channel.send(file=discord.File(game_state["file_path"], filename="secret.mp3"))
+            if pack_round:
+                file = discord.File(self.quiz_pack.open_clip(game_state["round"]), filename="secret.mp3")
+            else:
+                file = discord.File(game_state["file_path"], filename="secret.mp3")
+            await game_channel.send(file=file)
         except Exception as e:
             await game_channel.send(f"音声ファイル送信エラー: {e}")
             game_state["current_song_id"] = None
@@ -126,34 +276,43 @@ class GameManager:
 
         # 問題文の送信
         question_key = f"question_{game_state['round']+1}"
-        if self.config_ini.has_option('DEFAULT', question_key):
+        if pack_round:
+            await game_channel.send(pack_round["question"] or "⬆️ 曲名は何でしょう？")
+        elif self.config_ini.has_option('DEFAULT', question_key):
             question_text = self.config_ini.get('DEFAULT', question_key)
             await game_channel.send(question_text)
         else:
             await game_channel.send("⬆️ 曲名は何でしょう？")
 
-        # 選択肢の生成
-        choices_key = f"choices_{game_state['round']+1}"
-        if self.config_ini.has_option('DEFAULT', choices_key):
-            options = [s.strip() for s in self.config_ini.get('DEFAULT', choices_key).split(',')]
+        if self.answer_mode == "typed":
+            # チャット回答モードでは選択肢を出さない
+            await game_channel.send("チャットで曲名を入力してね！")
         else:
-            try:
-                options = self.generate_options(game_state["correct_answer_title"])
-            except Exception as e:
-                await game_channel.send(f"選択肢生成エラー: {e}")
-                del self.active_games[game_guild_id]
-                return False
+            # 選択肢の生成
+            choices_key = f"choices_{game_state['round']+1}"
+            if pack_round:
+                options = pack_round["choices"]
+            elif self.config_ini.has_option('DEFAULT', choices_key):
+                options = [s.strip() for s in self.config_ini.get('DEFAULT', choices_key).split(',')]
+            else:
+                try:
+                    options = self.generate_options(game_state["correct_answer_title"], game_state["correct_answer_artist"])
+                except Exception as e:
+                    await game_channel.send(f"選択肢生成エラー: {e}")
+                    del self.active_games[game_guild_id]
+                    return False
         
-        # ボタン生成
-        buttons = []
-        for i, opt in enumerate(options):
-            buttons.append(discord.ui.Button(label=opt, style=discord.ButtonStyle.primary, custom_id=f"introdon_answer_{opt}"))
-        view = discord.ui.View()
-        for button in buttons:
-            view.add_item(button)
-        await game_channel.send("選択肢を選んでね！:", view=view)
+            # ボタン生成
+            buttons = []
+            for i, opt in enumerate(options):
+                buttons.append(discord.ui.Button(label=opt, style=discord.ButtonStyle.primary, custom_id=f"introdon_answer_{opt}"))
+            view = discord.ui.View()
+            for button in buttons:
+                view.add_item(button)
+            await game_channel.send("選択肢を選んでね！:", view=view)
 
-        # 回答受付開始
+        # 回答受付開始（回答時間は選択肢の送信完了時点から計測）
+        game_state["round_started_at"] = time.monotonic()
         game_state["answering_lock"] = False
         game_state["question_sent"] = True
 
@@ -165,44 +324,351 @@ class GameManager:
         async def timer_and_close():
             await asyncio.sleep(self.answer_seconds)
             game_state["answering_lock"] = True
+            self.store_round_answers(game_state, song_id)
             await self.announce_round_results(game_guild_id, game_state)
+            stats_msg = await self.format_round_stats(game_state)
             if game_state["round"] >= self.rounds:
+                if stats_msg:
+                    await game_channel.send(stats_msg)
                 await game_channel.send("**--- クイズ終了！ ---**")
                 game_state["game_ended"] = True
+                self.store_final_results(game_state)
             else:
-                await game_channel.send("回答終了！！！")
+                await game_channel.send("回答終了！！！" + (f"\n{stats_msg}" if stats_msg else ""))
             
             # 回答終了後にコマンドボタンを再有効化
             if self.command_handler:
                 await self.command_handler.update_command_buttons(game_guild_id)
         
-        asyncio.create_task(timer_and_close())
+        asyncio.create_task(timer_and_close(), name=f"round_timer:{game_guild_id}")
         game_state["round"] += 1
         return True
     
+    async def load_question(self, game_guild_id, game_channel, game_state):
+        """出題する楽曲をDBから取得してゲーム状態に設定（失敗時はゲームを終了してFalse）"""
+        try:
+            # 楽曲情報をDBから取得
+            song_info = self.lookup_song(game_state["round"])
+            if not song_info:
+                await game_channel.send("楽曲が見つかりませんでした。クイズを終了します。")
+                del self.active_games[game_guild_id]
+                return False
+            song_id, correct_title, correct_artist, file_path = song_info
+            game_state["current_song_id"] = song_id
+            game_state["correct_answer_artist"] = correct_artist
+            game_state["file_path"] = file_path
+            game_state["round_answers"] = RoundAnswers()
+            game_state["question_sent"] = False
+            answer_key = f"answer_{game_state['round']+1}"
+            if self.config_ini.has_option('DEFAULT', answer_key):
+                game_state["correct_answer_title"] = self.config_ini.get('DEFAULT', answer_key).strip()
+            else:
+                game_state["correct_answer_title"] = correct_title
+        except Exception as e:
+            await game_channel.send(f"データベースエラー: {e}")
+            del self.active_games[game_guild_id]
+            return False
+        return True
+    
+    def lookup_song(self, round_index):
+        """出題する楽曲 (id, title, artist, path) をDBから取得（見つからない場合はNone）"""
+        if self.song_ids and len(self.song_ids) > round_index:
+            song_id = self.song_ids[round_index]
+        else:
+            catalog = self.get_catalog()
+            song_id = self.random.choice(catalog)[0] if catalog else None
+        if song_id is None:
+            return None
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, title, artist, path FROM songs WHERE id = ?", (song_id,))
+            song_info = cursor.fetchone()
+            conn.close()
+        except Exception as e:
+            if 'conn' in locals():
+                conn.close()
+            raise e
+        return song_info
+    
+    def prepare_round(self, round_index):
+        """スピードラウンドの1問分を準備（楽曲・選択肢・問題文の決定と音声ファイルの読み込み）
+
+        前の問題の回答時間中に別スレッドで実行する。
+        """
+        round_num = round_index + 1
+        if self.quiz_pack:
+            pack_round = self.quiz_pack.rounds[round_index]
+            return {
+                "song_id": pack_round["song_id"],
+                "title": pack_round["title"],
+                "artist": pack_round["artist"],
+                "file_path": f"{self.quiz_pack.path}#{round_num}",
+                "question": pack_round["question"] or "⬆️ 曲名は何でしょう？",
+                "options": pack_round["choices"],
+                "title_target": self.prepare_title_target(pack_round["title"]),
+            }
+        song_info = self.lookup_song(round_index)
+        if not song_info:
+            raise LookupError("楽曲が見つかりませんでした")
+        song_id, title, artist, file_path = song_info
+        title = self.config_ini.get('DEFAULT', f"answer_{round_num}", fallback=title).strip()
+        options = None
+        if self.answer_mode != "typed":
+            choices_key = f"choices_{round_num}"
+            if self.config_ini.has_option('DEFAULT', choices_key):
+                options = [s.strip() for s in self.config_ini.get('DEFAULT', choices_key).split(',')]
+            else:
+                options = self.generate_options(title, artist)
+        self.read_clip(file_path)
+        return {
+            "song_id": song_id,
+            "title": title,
+            "artist": artist,
+            "file_path": file_path,
+            "question": self.config_ini.get('DEFAULT', f"question_{round_num}", fallback="⬆️ 曲名は何でしょう？"),
+            "options": options,
+            "title_target": self.prepare_title_target(title),
+        }
+    
+    async def start_speed_rounds(self, game_guild_id, game_channel):
+        """スピードラウンドを開始（出題から正解発表までを自動で繰り返す）"""
+        game_state = self.get_game_state(game_guild_id)
+        if not game_state or game_state.get("speed_running") or game_state["round"] >= self.rounds:
+            return False
+        game_state["speed_running"] = True
+        asyncio.create_task(self.run_speed_rounds(game_guild_id, game_channel, game_state), name=f"speed_rounds:{game_guild_id}")
+        return True
+    
+    async def run_speed_rounds(self, game_guild_id, game_channel, game_state):
+        """スピードラウンドの進行
+
+        次の問題の準備（DB読み込み・選択肢生成・音声ファイルの読み込み）は現在の問題の
+        回答時間中に行い、出題はラウンド見出し・問題文・音声・選択肢を1件のメッセージで送る。
+        結果DB・スコアログへの書き込みは最後にまとめて行う。
+        """
+        loop = asyncio.get_running_loop()
+        count = min(self.speed_rounds or self.rounds, self.rounds - game_state["round"])
+        finished_rounds = []  # [(ラウンド番号, song_id, 回答)]
+        log_entries = []
+        try:
+            if self.command_handler:
+                await self.command_handler.update_command_buttons(game_guild_id)
+            await game_channel.send(f"**--- スピードラウンド開始！（全{count}問・各{self.answer_seconds}秒） ---**")
+            pending = loop.run_in_executor(None, self.prepare_round, game_state["round"])
+            for i in range(count):
+                try:
+                    prepared = await pending
+                except Exception as e:
+                    await game_channel.send(f"出題準備エラー: {e}")
+                    break
+                if self.active_games.get(game_guild_id) is not game_state:
+                    break  # ゲームが終了された
+                round_num = game_state["round"] + 1
+                game_state["current_song_id"] = prepared["song_id"]
+                game_state["correct_answer_title"] = prepared["title"]
+                game_state["title_target"] = prepared["title_target"]
+                game_state["correct_answer_artist"] = prepared["artist"]
+                game_state["file_path"] = prepared["file_path"]
+                game_state["round_answers"] = RoundAnswers()
+                
+                # 出題（1件のメッセージにまとめて送信）
+                content = f"**--- 第{round_num}ラウンド ---**\n{prepared['question']}"
+                view = None
+                if self.answer_mode == "typed":
+                    content += "\nチャットで曲名を入力してね！"
+                else:
+                    view = discord.ui.View()
+                    for opt in prepared["options"]:
+                        view.add_item(discord.ui.Button(label=opt, style=discord.ButtonStyle.primary, custom_id=f"introdon_answer_{opt}"))
+                if self.quiz_pack:
+                    file = discord.File(self.quiz_pack.open_clip(round_num - 1), filename="secret.mp3")
+                else:
+                    file = discord.File(prepared["file_path"], filename="secret.mp3")
+                try:
+                    await game_channel.send(content, file=file, view=view)
+                except Exception as e:
+                    await game_channel.send(f"音声ファイル送信エラー: {e}")
+                    game_state["current_song_id"] = None
+                    break
+                game_state["round_started_at"] = time.monotonic()
+                game_state["answering_lock"] = False
+                game_state["question_sent"] = True
+                game_state["round"] = round_num
+                print(f"=== スピードラウンド 第{round_num}問 出題: {prepared['title']} / {prepared['artist']} ===")
+                
+                # 回答時間中に次の問題を準備
+                if i + 1 < count:
+                    pending = loop.run_in_executor(None, self.prepare_round, round_num)
+                await asyncio.sleep(self.answer_seconds)
+                game_state["answering_lock"] = True
+                
+                # 結果は最後にまとめて書き込む
+                stats = game_state["round_answers"].stats()
+                finished_rounds.append((round_num, prepared["song_id"], game_state["round_answers"]))
+                sorted_scores = sorted(game_state["scores"].items(), key=lambda item: item[1], reverse=True)
+                log_entries.append(self.score_log_entry(game_guild_id, sorted_scores, round_num=round_num, stats=stats))
+                
+                # 正解発表
+                stats_msg = await self.format_round_stats(game_state)
+                correct_title, correct_artist = self.close_question(game_guild_id, game_state)
+                await game_channel.send(f"**正解: {correct_title} / {correct_artist}**" + (f"\n{stats_msg}" if stats_msg else ""))
+                if i + 1 < count:
+                    await asyncio.sleep(self.speed_reveal_seconds)
+        except Exception as e:
+            # 送信エラーなどで中断した場合も、スピードラウンドを終了してボタンを戻す
+            print(f"スピードラウンドエラー: {e}")
+            game_state["answering_lock"] = True
+        finally:
+            game_state["speed_running"] = False
+            if finished_rounds and self.result_store and game_state.get("game_id") is not None:
+                try:
+                    self.result_store.record_rounds(game_state["game_id"], finished_rounds)
+                except Exception as e:
+                    print(f"結果DB書き込みエラー: {e}")
+            if log_entries:
+                try:
+                    await self.write_score_log(log_entries)
+                except Exception as e:
+                    print(f"スコアログ書き込みエラー: {e}")
+        
+        if self.active_games.get(game_guild_id) is game_state:
+            if game_state["round"] >= self.rounds:
+                game_state["game_ended"] = True
+                self.store_final_results(game_state)
+                closing = "**--- クイズ終了！ ---**"
+            else:
+                closing = "**--- スピードラウンド終了！ ---**"
+            try:
+                await game_channel.send(closing)
+            except Exception as e:
+                print(f"スピードラウンド終了メッセージ送信エラー: {e}")
+        if self.command_handler:
+            await self.command_handler.update_command_buttons(game_guild_id)
+    
+    def score_points(self, elapsed):
+        """正解時の得点（speedモードでは残り時間に応じてボーナスを加算）"""
+        if self.scoring_mode != "speed":
+            return 1
+        remaining = max(0.0, 1.0 - elapsed / (self.scoring_seconds or self.answer_seconds))
+        return 1 + round(self.speed_bonus * remaining)
+    
+    async def submit_answer(self, guild_id, user_id, selected_answer):
+        """回答を受け付ける
+
+        戻り値: "closed"（回答期間外）, "already"（回答済み）, "correct", "wrong"
+        """
+        received_at = time.monotonic()
+        game_state = self.get_game_state(guild_id)
+        if not game_state or game_state["answering_lock"]:
+            return "closed"
+        round_answers = game_state["round_answers"]
+        if user_id in round_answers:
+            return "already"
+        if user_id not in game_state["scores"]:
+            game_state["scores"][user_id] = 0
+        elapsed = received_at - game_state["round_started_at"]
+        correct = selected_answer == game_state["correct_answer_title"]
+        round_answers.add(user_id, selected_answer, correct, elapsed)
+        if correct:
+            game_state["scores"][user_id] += self.score_points(elapsed)
+            return "correct"
+        return "wrong"
+    
+    async def submit_typed_answer(self, guild_id, user_id, text):
+        """チャットで入力された曲名を判定（各ユーザーの最初の正解のみ得点）
+
+        戻り値: 正解の場合は"correct"、それ以外はNone
+        """
+        received_at = time.monotonic()
+        game_state = self.get_game_state(guild_id)
+        if not game_state or game_state["answering_lock"]:
+            return None
+        round_answers = game_state["round_answers"]
+        if user_id in round_answers:
+            return None
+        target = game_state.get("title_target")
+        if target is None:
+            target = game_state["title_target"] = self.get_title_index().prepare(game_state["correct_answer_title"])
+        if not self.get_title_index().match(text, target):
+            return None
+        if user_id not in game_state["scores"]:
+            game_state["scores"][user_id] = 0
+        elapsed = received_at - game_state["round_started_at"]
+        round_answers.add(user_id, text, True, elapsed)
+        game_state["scores"][user_id] += self.score_points(elapsed)
+        return "correct"
+    
+    def store_round_answers(self, game_state, song_id):
+        """ラウンドの回答を結果DBにまとめて書き込む"""
+        round_answers = game_state["round_answers"]
+        if not self.result_store or game_state.get("game_id") is None:
+            return
+        try:
+            self.result_store.record_round(game_state["game_id"], game_state["round"], song_id, round_answers)
+        except Exception as e:
+            print(f"結果DB書き込みエラー: {e}")
+    
+    def store_final_results(self, game_state):
+        """最終結果を結果DBに書き込む（1ゲームにつき1回）"""
+        if not self.result_store or game_state.get("game_id") is None or game_state.get("results_stored"):
+            return
+        game_state["results_stored"] = True
+        sorted_scores = sorted(game_state["scores"].items(), key=lambda item: item[1], reverse=True)
+        try:
+            self.result_store.record_final(game_state["game_id"], sorted_scores)
+        except Exception as e:
+            print(f"結果DB書き込みエラー: {e}")
+    
+    async def format_round_stats(self, game_state):
+        """ラウンドの回答時間（最速・中央値）のメッセージを作成"""
+        stats = game_state["round_answers"].stats()
+        if not stats:
+            return None
+        user_id = stats["fastest_user_id"]
+        try:
+            user = self.bot.get_user(user_id) or await self.bot.fetch_user(user_id)
+            name = user.display_name
+        except Exception:
+            name = f"ユーザーID:{user_id}"
+        return f"最速: {name} ({stats['fastest']:.2f}秒) / 正解者の中央値: {stats['median']:.2f}秒 / 正解者: {stats['count']}人"
+    
     async def announce_round_results(self, guild_id, game_state):
         """ラウンド終了時のスコアログ出力"""
         sorted_scores = sorted(game_state["scores"].items(), key=lambda item: item[1], reverse=True)
         round_num = game_state["round"]
-        await self.log_score(guild_id, sorted_scores, ended=False, round_num=round_num)
+        await self.log_score(guild_id, sorted_scores, ended=False, round_num=round_num, stats=game_state["round_answers"].stats())
     
-    async def log_score(self, guild_id, sorted_scores, ended=False, round_num=None):
+    async def log_score(self, guild_id, sorted_scores, ended=False, round_num=None, stats=None):
         """スコアログ出力"""
+        await self.write_score_log([self.score_log_entry(guild_id, sorted_scores, ended, round_num, stats)])
+    
+    def score_log_entry(self, guild_id, sorted_scores, ended=False, round_num=None, stats=None):
+        """スコアログ1件分（write_score_logでまとめて書き込む）"""
         now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return (now, guild_id, list(sorted_scores), ended, round_num, stats)
+    
+    async def write_score_log(self, entries):
+        """スコアログをまとめて書き込む（ユーザー名の取得は1人1回）"""
+        names = {}
         with open(self.log_path, 'a', encoding='utf-8') as f:
-            f.write(f'[{now}] guild_id={guild_id} {"最終結果" if ended else "途中経過"}')
-            if round_num is not None:
-                f.write(f' 第{round_num}問')
-            f.write('\n')
-            for i, (user_id, score) in enumerate(sorted_scores, 1):
-                try:
-                    user = await self.bot.fetch_user(user_id)
-                    name = user.display_name
-                except Exception:
-                    name = f"ユーザーID:{user_id}"
-                f.write(f'{i}位: {name} ({score}点)\n')
-            f.write('\n')
-            f.write('--------------------------------\n')
+            for now, guild_id, sorted_scores, ended, round_num, stats in entries:
+                f.write(f'[{now}] guild_id={guild_id} {"最終結果" if ended else "途中経過"}')
+                if round_num is not None:
+                    f.write(f' 第{round_num}問')
+                f.write('\n')
+                if stats:
+                    f.write(f'回答時間: 最速 {stats["fastest"]:.3f}秒 (ユーザーID:{stats["fastest_user_id"]}) 中央値 {stats["median"]:.3f}秒 正解者 {stats["count"]}人\n')
+                for i, (user_id, score) in enumerate(sorted_scores, 1):
+                    if user_id not in names:
+                        try:
+                            user = await self.bot.fetch_user(user_id)
+                            names[user_id] = user.display_name
+                        except Exception:
+                            names[user_id] = f"ユーザーID:{user_id}"
+                    f.write(f'{i}位: {names[user_id]} ({score}点)\n')
+                f.write('\n')
+                f.write('--------------------------------\n')
     
     def get_game_state(self, guild_id):
         """ゲーム状態を取得"""
@@ -213,6 +679,9 @@ class GameManager:
         game_state = self.get_game_state(guild_id)
         if not game_state:
             return False
+        if game_state.get("speed_running"):
+            # スピードラウンド中は正解発表の間も出題中として扱う
+            return True
         return game_state.get("question_sent", False) and not game_state.get("answering_lock", True)
     
     def is_waiting_for_answer(self, guild_id):
@@ -237,11 +706,31 @@ class GameManager:
     def end_game(self, guild_id):
         """ゲーム終了"""
         if guild_id in self.active_games:
+            self.store_final_results(self.active_games[guild_id])
             del self.active_games[guild_id]
             # ゲーム終了時にコマンドボタンを更新
             if self.command_handler:
                 asyncio.create_task(self.command_handler.update_command_buttons(guild_id))
     
+    async def reveal_answer(self, guild_id):
+        """正解発表（コンソールに出力し、次の問題を出題できる状態に戻す）
+
+        戻り値: (曲名, アーティスト)。スピードラウンド中は自動で発表するためNone
+        """
+        game_state = self.get_game_state(guild_id)
+        if game_state.get("speed_running"):
+            return None
+        return self.close_question(guild_id, game_state)
+    
+    def close_question(self, guild_id, game_state):
+        """出題中の問題を締めくくり、正解 (曲名, アーティスト) を返す"""
+        correct_title = game_state.get("correct_answer_title", "不明")
+        correct_artist = game_state.get("correct_answer_artist", "不明")
+        self.log_answer(guild_id, correct_title, correct_artist)
+        game_state["current_song_id"] = None
+        game_state["question_sent"] = False
+        return correct_title, correct_artist
+    
     def log_answer(self, guild_id, correct_title, correct_artist):
         """正解発表をコンソールに出力"""
         print(f"=== 正解発表 ===")
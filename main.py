@@ -1,13 +1,28 @@
+import time
+STARTUP_AT = time.perf_counter()  # 起動プロファイルの基準時刻（importより前に取得）
+
 import discord
 from discord.ext import commands
 import configparser
 import argparse
+import asyncio
+import random
 from game_manager import GameManager
 from command_handler import CommandHandler
+from result_store import ResultStore
+from trace_recorder import TraceRecorder
+from diagnostics import LoopMonitor
+from engine_client import RemoteGameManager
+from startup_profile import StartupProfiler
+
+profiler = StartupProfiler(STARTUP_AT)
+profiler.mark("モジュール読み込み")
 
 # 設定ファイルの読み込み
 parser = argparse.ArgumentParser()
 parser.add_argument('--config', type=str, default='config.ini', help='設定ファイル(.ini)のパス')
+parser.add_argument('--no-trace', action='store_true', help='trace_pathの設定に関わらずトレースを記録しない')
+parser.add_argument('--profile-startup', action='store_true', help='起動処理の段階ごとの所要時間を表示する')
 args, unknown = parser.parse_known_args()
 
 config_ini = configparser.ConfigParser()
@@ -21,6 +36,17 @@ BOT_TOKEN = config_ini.get('DEFAULT', 'bot_token')
 ROUNDS = config_ini.getint('DEFAULT', 'rounds', fallback=5)
 LOG_PATH = config_ini.get('DEFAULT', 'log_path', fallback='score_log.txt')
 ANSWER_SECONDS = config_ini.getint('DEFAULT', 'answer_seconds', fallback=15)
+RESULTS_DB_PATH = config_ini.get('DEFAULT', 'results_db_path', fallback=None)
+TRACE_PATH = None if args.no_trace else config_ini.get('DEFAULT', 'trace_path', raw=True, fallback=None)  # strftimeの%をそのまま使うためraw
+RANDOM_SEED = config_ini.getint('DEFAULT', 'random_seed', fallback=None)
+admin_user_ids_str = config_ini.get('DEFAULT', 'admin_user_ids', fallback=None)
+ADMIN_USER_IDS = [int(s.strip()) for s in admin_user_ids_str.split(',')] if admin_user_ids_str else []
+LOOP_MONITOR_INTERVAL = config_ini.getfloat('DEFAULT', 'loop_monitor_interval', fallback=1.0)
+SLOW_CALLBACK_MS = config_ini.getint('DEFAULT', 'slow_callback_ms', fallback=100)
+LOOP_DEBUG = config_ini.getboolean('DEFAULT', 'loop_debug', fallback=False)
+ENGINE_SOCKET = config_ini.get('DEFAULT', 'engine_socket', fallback=None)
+
+profiler.mark("設定読み込み")
 
 # チャンネル設定の取得
 GAME_CHANNEL_ID = config_ini.getint('DEFAULT', 'game_channel_id', fallback=None)
@@ -36,11 +62,56 @@ intents.message_content = True
 bot = commands.Bot(command_prefix='/', intents=intents)
 
 # ゲームマネージャーとコマンドハンドラーの初期化
-game_manager = GameManager(bot, config_ini, DB_PATH, LOG_PATH, ROUNDS, SONG_IDS, ANSWER_SECONDS)
-command_handler = CommandHandler(bot, game_manager, GAME_GUILD_ID, COMMAND_GUILD_ID, GAME_CHANNEL_ID, COMMAND_CHANNEL_ID)
+if ENGINE_SOCKET:
+    # ゲームエンジンを別プロセス（engine.py）で動かす場合
+    game_manager = RemoteGameManager(bot, config_ini, ENGINE_SOCKET)
+else:
+    result_store = ResultStore(RESULTS_DB_PATH) if RESULTS_DB_PATH else None
+    # トレース記録時はリプレイで再現できるよう乱数シードを必ず固定する
+    if TRACE_PATH and RANDOM_SEED is None:
+        RANDOM_SEED = random.randrange(2 ** 32)
+    game_manager = GameManager(bot, config_ini, DB_PATH, LOG_PATH, ROUNDS, SONG_IDS, ANSWER_SECONDS, result_store=result_store, seed=RANDOM_SEED)
+command_handler = CommandHandler(bot, game_manager, GAME_GUILD_ID, COMMAND_GUILD_ID, GAME_CHANNEL_ID, COMMAND_CHANNEL_ID, admin_user_ids=ADMIN_USER_IDS)
+
+# イベントループ監視（on_readyで開始）
+loop_monitor = LoopMonitor(interval=LOOP_MONITOR_INTERVAL, slow_threshold=SLOW_CALLBACK_MS / 1000)
+command_handler.loop_monitor = loop_monitor
+
+# トレース記録の初期化（trace_pathが設定されている場合のみ）
+trace_recorder = TraceRecorder(TRACE_PATH, RANDOM_SEED, config=args.config, answer_seconds=ANSWER_SECONDS) if TRACE_PATH else None
+command_handler.trace_recorder = trace_recorder
+if ENGINE_SOCKET:
+    game_manager.trace_recorder = trace_recorder
+
+def answer_elapsed(game_guild_id):
+    """出題からの経過秒数（トレースに記録し、リプレイで同じ回答時間を再現する）"""
+    game_state = game_manager.get_game_state(game_guild_id)
+    if not game_state or game_state.get("round_started_at") is None:
+        return None
+    return time.monotonic() - game_state["round_started_at"]
+
+def trace_channel(channel):
+    """トレース記録中は送信内容を記録するチャンネルを返す"""
+    if trace_recorder:
+        return trace_recorder.wrap_channel(channel)
+    return channel
 
 # GameManagerにCommandHandlerの参照を設定
 game_manager.command_handler = command_handler
+profiler.mark("初期化")
+
+async def warm_up():
+    """カタログ・インデックス・音声ファイルの事前読み込み（ログイン後にバックグラウンドで実行）"""
+    try:
+        await game_manager.warm_up(profiler)
+        print(f"ゲームの準備が完了しました（起動から{profiler.elapsed():.2f}秒）")
+    except Exception as e:
+        # 失敗してもゲーム開始時に改めて読み込まれる
+        print(f"事前読み込みエラー: {e}")
+    if args.profile_startup:
+        profiler.report()
+
+warm_up_task = None
 
 # コマンド定義
 @bot.command()
@@ -51,6 +122,10 @@ async def start(ctx):
 async def next(ctx):
     await command_handler.handle_next_command(ctx)
 
+@bot.command()
+async def speed(ctx):
+    await command_handler.handle_speed_command(ctx)
+
 @bot.command()
 async def answer(ctx):
     await command_handler.handle_answer_command(ctx)
@@ -59,12 +134,27 @@ async def answer(ctx):
 async def score(ctx):
     await command_handler.handle_score_command(ctx)
 
+@bot.command()
+async def diag(ctx):
+    await command_handler.handle_diag_command(ctx)
+
 # ボタンのインタラクション処理
 @bot.event
 async def on_interaction(interaction: discord.Interaction):
     if interaction.type.name == "component":
         custom_id = interaction.data.get('custom_id')
         
+        # トレース記録（開始ボタンはスコア初期化に使うメンバーも記録）
+        if trace_recorder:
+            members = None
+            elapsed = None
+            if custom_id == "cmd_start":
+                game_guild = bot.get_guild(GAME_GUILD_ID) if GAME_GUILD_ID else interaction.guild
+                members = game_guild.members if game_guild else []
+            elif custom_id and custom_id.startswith("introdon_answer_"):
+                elapsed = answer_elapsed(GAME_GUILD_ID or interaction.guild.id)
+            trace_recorder.record_interaction(interaction, members=members, elapsed=elapsed)
+        
         # コマンドボタンの処理
         if custom_id and custom_id.startswith("cmd_"):
             # コマンドサーバー権限チェック
@@ -81,7 +171,14 @@ async def on_interaction(interaction: discord.Interaction):
             command = custom_id.replace("cmd_", "")
             game_guild_id = GAME_GUILD_ID or interaction.guild.id
             
-            if command == "start":
+            if command == "diag":
+                # 診断情報の表示（管理者のみ）
+                if not command_handler.is_admin(interaction.user):
+                    await interaction.response.send_message("このボタンは管理者のみ使用できます。", ephemeral=True, delete_after=5.0)
+                    return
+                await interaction.response.send_message(command_handler.create_diagnostics_report(), ephemeral=True)
+                
+            elif command == "start":
                 # ゲーム開始処理
                 
                 # ゲーム進行中かどうかをチェック
@@ -106,10 +203,12 @@ async def on_interaction(interaction: discord.Interaction):
                 
                 # ゲーム状態を初期化
                 await game_manager.start_game(game_guild_id, members)
+                command_handler.scoreboard.end_game(game_guild_id)  # 前のゲームのスコアボードを切り離す
                 
                 # ゲーム開始メッセージをゲームチャンネルに送信
                 game_guild = bot.get_guild(GAME_GUILD_ID) if GAME_GUILD_ID else interaction.guild
                 game_channel = game_guild.get_channel(GAME_CHANNEL_ID) if GAME_CHANNEL_ID else interaction.channel
+                game_channel = trace_channel(game_channel)
                 if game_channel:
                     await game_channel.send("楽曲クイズを始めるわよ！")
                 
@@ -140,6 +239,7 @@ async def on_interaction(interaction: discord.Interaction):
                     game_channel = game_guild.get_channel(GAME_CHANNEL_ID) if game_guild else None
                 else:
                     game_channel = interaction.channel
+                game_channel = trace_channel(game_channel)
                 
                 if not game_channel:
                     await interaction.response.send_message("ゲームチャンネルが見つかりません。", ephemeral=True)
@@ -153,6 +253,28 @@ async def on_interaction(interaction: discord.Interaction):
                 else:
                     await interaction.response.send_message("問題の出題に失敗しました。", ephemeral=True)
                 
+            elif command == "speed":
+                # スピードラウンド開始処理
+                if not game_manager.get_game_state(game_guild_id):
+                    await interaction.response.send_message("現在アクティブなゲームはありません。/start で開始してください。", ephemeral=True, delete_after=5.0)
+                    return
+                
+                if game_manager.is_question_active(game_guild_id) or game_manager.is_waiting_for_answer(game_guild_id):
+                    await interaction.response.send_message("現在の問題が終わってからスピードラウンドを開始してください。", ephemeral=True)
+                    return
+                
+                game_guild = bot.get_guild(GAME_GUILD_ID) if GAME_GUILD_ID else interaction.guild
+                game_channel = game_guild.get_channel(GAME_CHANNEL_ID) if GAME_CHANNEL_ID else interaction.channel
+                game_channel = trace_channel(game_channel)
+                if not game_channel:
+                    await interaction.response.send_message("ゲームチャンネルが見つかりません。", ephemeral=True)
+                    return
+                
+                if await game_manager.start_speed_rounds(game_guild_id, game_channel):
+                    await interaction.response.send_message("スピードラウンドを開始しました。", ephemeral=True, delete_after=5.0)
+                else:
+                    await interaction.response.send_message("スピードラウンドを開始できませんでした。残りの問題がありません。", ephemeral=True)
+                
             elif command == "answer":
                 # 正解発表処理
                 if not game_manager.get_game_state(game_guild_id):
@@ -160,16 +282,16 @@ async def on_interaction(interaction: discord.Interaction):
                     return
                 
                 game_state = game_manager.get_game_state(game_guild_id)
+                if game_state.get("speed_running"):
+                    await interaction.response.send_message("スピードラウンド中は正解が自動で発表されます。", ephemeral=True)
+                    return
+                
                 if game_state["current_song_id"] is None:
                     await interaction.response.send_message("現在出題中の問題はありません。", ephemeral=True)
                     return
                 
-                # 正解情報を取得
-                correct_title = game_state.get("correct_answer_title", "不明")
-                correct_artist = game_state.get("correct_answer_artist", "不明")
-                
-                # 正解発表をコンソールに出力
-                game_manager.log_answer(game_guild_id, correct_title, correct_artist)
+                # 正解情報を取得し、ゲーム状態を更新（次の問題の準備）
+                correct_title, correct_artist = await game_manager.reveal_answer(game_guild_id)
                 
                 # 正解メッセージを作成
                 answer_msg = f"**正解発表！**\n"
@@ -179,13 +301,10 @@ async def on_interaction(interaction: discord.Interaction):
                 # ゲームチャンネルに正解を送信
                 game_guild = bot.get_guild(GAME_GUILD_ID) if GAME_GUILD_ID else interaction.guild
                 game_channel = game_guild.get_channel(GAME_CHANNEL_ID) if GAME_CHANNEL_ID else interaction.channel
+                game_channel = trace_channel(game_channel)
                 if game_channel:
                     await game_channel.send(answer_msg)
                 
-                # 正解発表後にゲーム状態を更新（次の問題の準備）
-                game_state["current_song_id"] = None
-                game_state["question_sent"] = False
-                
                 # コマンドボタンを更新（確実に実行）
                 await command_handler.update_command_buttons(game_guild_id)
                 
@@ -199,48 +318,27 @@ async def on_interaction(interaction: discord.Interaction):
                 
                 game_state = game_manager.get_game_state(game_guild_id)
                 sorted_scores = sorted(game_state["scores"].items(), key=lambda item: item[1], reverse=True)
+                final = bool(game_state.get("game_ended"))
+                
+                # ゲームチャンネルのスコアボードを更新（最初の1回のみ送信してピン留め）
+                game_guild = bot.get_guild(GAME_GUILD_ID) if GAME_GUILD_ID else interaction.guild
+                game_channel = game_guild.get_channel(GAME_CHANNEL_ID) if GAME_CHANNEL_ID else interaction.channel
+                game_channel = trace_channel(game_channel)
+                if game_channel:
+                    await command_handler.scoreboard.publish(game_guild_id, game_channel, sorted_scores, final=final)
                 
-                if game_state.get("game_ended"):
-                    ranking_msg = "**--- 最終順位 ---**\n"
-                    rank = 1
-                    prev_score = -1
-                    for i, (user_id, score) in enumerate(sorted_scores):
-                        try:
-                            user = await bot.fetch_user(user_id)
-                            if score < prev_score:
-                                rank = i + 1
-                            ranking_msg += f"{rank}位: {user.display_name} ({score}点)\n"
-                            prev_score = score
-                        except Exception:
-                            ranking_msg += f"{rank}位: ユーザーID:{user_id} ({score}点)\n"
-                            prev_score = score
-                    
-                    # ゲームチャンネルに送信
-                    game_guild = bot.get_guild(GAME_GUILD_ID) if GAME_GUILD_ID else interaction.guild
-                    game_channel = game_guild.get_channel(GAME_CHANNEL_ID) if GAME_CHANNEL_ID else interaction.channel
-                    if game_channel:
-                        await game_channel.send(ranking_msg)
-                    
+                if final:
                     await interaction.response.send_message("最終結果をゲームチャンネルに送信しました。", ephemeral=True, delete_after=5.0)
                 else:
-                    scoreboard_msg = "**--- 現在のスコア ---**\n"
-                    for user_id, score in sorted_scores:
-                        try:
-                            user = await bot.fetch_user(user_id)
-                            scoreboard_msg += f"{user.display_name}: {score}点\n"
-                        except Exception:
-                            scoreboard_msg += f"ユーザーID:{user_id}: {score}点\n"
-                    
-                    # ゲームチャンネルに送信
-                    game_guild = bot.get_guild(GAME_GUILD_ID) if GAME_GUILD_ID else interaction.guild
-                    game_channel = game_guild.get_channel(GAME_CHANNEL_ID) if GAME_CHANNEL_ID else interaction.channel
-                    if game_channel:
-                        await game_channel.send(scoreboard_msg)
-                    
                     await interaction.response.send_message("現在のスコアをゲームチャンネルに送信しました。", ephemeral=True, delete_after=5.0)
             
             return
         
+        # スコアボードのページ切り替え
+        if custom_id and custom_id.startswith("scoreboard_page_"):
+            await command_handler.scoreboard.handle_page_button(interaction)
+            return
+        
         # 回答ボタンの処理
         if custom_id and custom_id.startswith("introdon_answer_"):
             # ゲームサーバー権限チェック いらないかも
@@ -256,32 +354,64 @@ async def on_interaction(interaction: discord.Interaction):
             # ゲームサーバーIDを取得
             game_guild_id = GAME_GUILD_ID or interaction.guild.id
             
-            if not game_manager.get_game_state(game_guild_id) or game_manager.get_game_state(game_guild_id)["answering_lock"]:
+            selected_answer = custom_id.replace("introdon_answer_", "")
+            result = await game_manager.submit_answer(game_guild_id, interaction.user.id, selected_answer)
+            if result == "closed":
                 await interaction.response.send_message("回答期間は終了しました。", ephemeral=True)
                 return
-            if interaction.user.id in game_manager.get_game_state(game_guild_id)["answered_users"]:
+            if result == "already":
                 await interaction.response.send_message("このラウンドでは既に回答済みです。", ephemeral=True)
                 return
-            selected_answer = custom_id.replace("introdon_answer_", "")
-            correct_title = game_manager.get_game_state(game_guild_id)["correct_answer_title"]
-            user_id = interaction.user.id
-            if user_id not in game_manager.get_game_state(game_guild_id)["scores"]:
-                game_manager.get_game_state(game_guild_id)["scores"][user_id] = 0
-            game_manager.get_game_state(game_guild_id)["answered_users"].append(user_id)
             # 正誤判定を送る場合はコメントアウトを切り替え
-            if selected_answer == correct_title:
-                game_manager.get_game_state(game_guild_id)["scores"][user_id] += 1
+            if result == "correct":
                 # await interaction.response.send_message("正解！", ephemeral=True)
                 await interaction.response.send_message("回答済み", ephemeral=True)
             else:
                 # await interaction.response.send_message("残念、不正解。", ephemeral=True)
                 await interaction.response.send_message("回答済み", ephemeral=True)
 
+# チャット回答の処理（answer_mode = typed の場合のみ）
+@bot.listen('on_message')
+async def on_typed_answer(message: discord.Message):
+    if game_manager.answer_mode != "typed" or message.author.bot or message.guild is None:
+        return
+    if GAME_CHANNEL_ID is not None and message.channel.id != GAME_CHANNEL_ID:
+        return
+    if message.content.startswith(bot.command_prefix):
+        return
+    
+    # 出題中でなければ回答として扱わない（エンジン使用時も手元のゲーム状態の写しで判定し、通信しない）
+    game_guild_id = GAME_GUILD_ID or message.guild.id
+    if not game_manager.is_question_active(game_guild_id):
+        return
+    
+    if trace_recorder:
+        trace_recorder.record_message(message, elapsed=answer_elapsed(game_guild_id))
+    
+    result = await game_manager.submit_typed_answer(game_guild_id, message.author.id, message.content)
+    if result == "correct":
+        # 他の参加者に正解が見えないようにメッセージを削除
+        try:
+            await message.delete()
+        except:
+            pass  # 削除できない場合は無視
+
 # Bot起動
 if __name__ == '__main__':
     @bot.event
     async def on_ready():
+        global warm_up_task
         print(f'{bot.user} としてログインしました')
+        first_ready = warm_up_task is None
+        if first_ready:
+            profiler.mark("ログイン")
+        
+        # イベントループ監視を開始（再接続時は何もしない）
+        loop_monitor.start(loop_debug=LOOP_DEBUG)
+        
+        # 事前読み込み（エンジン使用時は接続も含む）はパネル表示を待たせないようバックグラウンドで行う
+        if first_ready:
+            warm_up_task = asyncio.create_task(warm_up())
         
         # コマンド用サーバーにメッセージを送信
         if COMMAND_GUILD_ID is not None and COMMAND_CHANNEL_ID is not None:
@@ -293,6 +423,8 @@ if __name__ == '__main__':
                     command_view = command_handler.create_command_buttons()
                     await command_channel.send("🎵 **音楽クイズボットが起動しました！**\n\n**開始**ボタンを押してゲームを開始してください。", view=command_view)
                     print(f"コマンド用チャンネル {command_channel.name} にメッセージを送信しました")
+                    if first_ready:
+                        profiler.mark("コマンドパネル表示")
                 else:
                     print(f"コマンド用チャンネルが見つかりません: {COMMAND_CHANNEL_ID}")
             else:
@@ -0,0 +1,227 @@
+"""クイズパック（1ファイルにまとめた出題データ）
+
+python quiz_pack.py build --config 設定ファイル --output 出力ファイル
+python quiz_pack.py info パックファイル
+
+config.iniの出題設定（song_ids・choices_n・answer_n・question_n・rounds）と
+楽曲DB・音声ファイルを、インデックス付きの1つのバイナリファイルにまとめる。
+読み込みはmmapで行い、各音声ファイルはコピーせずにファイル上の範囲をそのまま送信する。
+
+ファイル形式（数値はすべてビッグエンディアン）:
+    マジック "MQPACK1\\0"（8バイト）
+    ラウンド数・メタデータ長（各4バイト）
+    インデックス: ラウンドごとに音声の開始位置・長さ（各8バイト、開始位置はファイル先頭から）
+    メタデータ: JSON（UTF-8）
+    音声データ（連結）
+"""
+import argparse
+import configparser
+import io
+import json
+import mmap
+import os
+import sqlite3
+import struct
+
+MAGIC = b"MQPACK1\0"
+HEADER = struct.Struct(">II")
+INDEX_ENTRY = struct.Struct(">QQ")
+
+class QuizPack:
+    """クイズパックをmmapで読み込む
+
+    rounds: ラウンドごとのメタデータ（song_id, title, artist, answer, question, choices, filename）
+    catalog: チャット回答の判定に使う楽曲カタログ [(id, title, artist), ...]
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        with open(self.path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mmap)
+        try:
+            if bytes(self.view[:len(MAGIC)]) != MAGIC:
+                raise ValueError(f"クイズパックではありません: {path}")
+            round_count, meta_length = HEADER.unpack_from(self.mmap, len(MAGIC))
+            index_start = len(MAGIC) + HEADER.size
+            self.index = [INDEX_ENTRY.unpack_from(self.mmap, index_start + i * INDEX_ENTRY.size) for i in range(round_count)]
+            meta_start = index_start + round_count * INDEX_ENTRY.size
+            meta = json.loads(bytes(self.view[meta_start:meta_start + meta_length]).decode('utf-8'))
+        except Exception:
+            self.close()
+            raise
+        self.title = meta.get("title")
+        self.rounds = meta["rounds"]
+        self.catalog = [tuple(row) for row in meta["catalog"]]
+
+    def __len__(self):
+        return len(self.rounds)
+
+    def clip(self, round_index):
+        """ラウンドの音声データ（コピーなしのmemoryview）"""
+        offset, length = self.index[round_index]
+        return self.view[offset:offset + length]
+
+    def open_clip(self, round_index):
+        """ラウンドの音声データを読み出すファイルオブジェクト（discord.Fileに渡せる）"""
+        return ClipReader(self, round_index)
+
+    def preload(self):
+        """音声データをOSのキャッシュに読み込むよう要求する（対応環境のみ）"""
+        if hasattr(self.mmap, "madvise") and hasattr(mmap, "MADV_WILLNEED"):
+            self.mmap.madvise(mmap.MADV_WILLNEED)
+
+    def close(self):
+        self.view.release()
+        self.mmap.close()
+
+class ClipReader(io.RawIOBase):
+    """パック内の1ラウンド分の音声データを読み出す（mmapから直接コピー）"""
+
+    def __init__(self, pack, round_index):
+        self.pack = pack
+        self.round_index = round_index
+        self.data = pack.clip(round_index)
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), len(self.data) - self.position)
+        if size <= 0:
+            return 0
+        buffer[:size] = self.data[self.position:self.position + size]
+        self.position += size
+        return size
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        elif whence == io.SEEK_END:
+            position = len(self.data) + offset
+        else:
+            raise ValueError(f"不正なwhenceです: {whence}")
+        if position < 0:
+            raise ValueError("負の位置にはシークできません")
+        self.position = position
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def close(self):
+        if not self.closed:
+            self.data.release()
+        super().close()
+
+def write_pack(path, rounds, catalog, clip_paths, title=None):
+    """クイズパックを書き出す（一時ファイルに書いてから置き換える）"""
+    meta = json.dumps({"title": title, "rounds": rounds, "catalog": [list(row) for row in catalog]},
+                      ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    data_start = len(MAGIC) + HEADER.size + len(rounds) * INDEX_ENTRY.size + len(meta)
+    index = []
+    offset = data_start
+    for clip_path in clip_paths:
+        length = os.path.getsize(clip_path)
+        index.append((offset, length))
+        offset += length
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(HEADER.pack(len(rounds), len(meta)))
+        for entry in index:
+            f.write(INDEX_ENTRY.pack(*entry))
+        f.write(meta)
+        for clip_path in clip_paths:
+            with open(clip_path, 'rb') as clip:
+                while True:
+                    chunk = clip.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+    os.replace(tmp_path, path)
+
+def build_pack(config_ini, output, title=None):
+    """設定ファイルと楽曲DBからクイズパックを作成
+
+    選択肢はGameManagerと同じ方法（option_mode・random_seedに従う）で作成時に決めておく。
+    """
+    from game_manager import GameManager
+    # 本番用の設定ファイル（quiz_pack設定済み）でも、既存のパックではなく楽曲DBから作成する
+    source_config = configparser.ConfigParser()
+    source_config.read_dict(config_ini)
+    source_config.remove_option('DEFAULT', 'quiz_pack')
+    config_ini = source_config
+    db_path = config_ini.get('DEFAULT', 'db_path', fallback='songs.db')
+    song_ids_str = config_ini.get('DEFAULT', 'song_ids', fallback=None)
+    song_ids = [int(s.strip()) for s in song_ids_str.split(',')] if song_ids_str else None
+    rounds = config_ini.getint('DEFAULT', 'rounds', fallback=5)
+    seed = config_ini.getint('DEFAULT', 'random_seed', fallback=None)
+    game_manager = GameManager(None, config_ini, db_path, os.devnull, rounds, song_ids, 0, seed=seed)
+    catalog = game_manager.get_catalog()
+
+    pack_rounds = []
+    clip_paths = []
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        for round_num in range(1, rounds + 1):
+            if song_ids and len(song_ids) >= round_num:
+                song_id = song_ids[round_num - 1]
+            else:
+                song_id = game_manager.random.choice(catalog)[0]
+            cursor.execute("SELECT id, title, artist, path FROM songs WHERE id = ?", (song_id,))
+            song_info = cursor.fetchone()
+            if not song_info:
+                raise LookupError(f"楽曲が見つかりません: {song_id}")
+            song_id, song_title, artist, file_path = song_info
+            answer = config_ini.get('DEFAULT', f"answer_{round_num}", fallback=song_title).strip()
+            choices_key = f"choices_{round_num}"
+            if config_ini.has_option('DEFAULT', choices_key):
+                choices = [s.strip() for s in config_ini.get('DEFAULT', choices_key).split(',')]
+            else:
+                choices = game_manager.generate_options(answer, artist)
+            pack_rounds.append({
+                "song_id": song_id,
+                "title": answer,
+                "artist": artist,
+                "question": config_ini.get('DEFAULT', f"question_{round_num}", fallback=None),
+                "choices": choices,
+                "filename": os.path.basename(file_path),
+            })
+            clip_paths.append(file_path)
+    finally:
+        conn.close()
+    write_pack(output, pack_rounds, catalog, clip_paths, title=title)
+    return len(pack_rounds)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='クイズパックの作成・確認')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help='設定ファイルと楽曲DBからクイズパックを作成')
+    build_parser.add_argument('--config', type=str, default='config.ini', help='設定ファイル(.ini)のパス')
+    build_parser.add_argument('--output', type=str, required=True, help='出力するクイズパックのパス')
+    build_parser.add_argument('--title', type=str, default=None, help='クイズパックの名前')
+    info_parser = subparsers.add_parser('info', help='クイズパックの内容を表示')
+    info_parser.add_argument('pack', type=str, help='クイズパックのパス')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        config_ini = configparser.ConfigParser()
+        config_ini.read(args.config, encoding='utf-8')
+        count = build_pack(config_ini, args.output, title=args.title)
+        print(f"クイズパックを作成しました: {args.output}（{count}ラウンド, {os.path.getsize(args.output)}バイト）")
+    else:
+        pack = QuizPack(args.pack)
+        print(f"クイズパック: {pack.title or os.path.basename(pack.path)}（{len(pack)}ラウンド, 楽曲カタログ {len(pack.catalog)}曲）")
+        for i, round_info in enumerate(pack.rounds):
+            offset, length = pack.index[i]
+            print(f"  第{i + 1}ラウンド: {round_info['title']} / {round_info['artist']}（{round_info['filename']}, {length}バイト）")
+        pack.close()
@@ -0,0 +1,267 @@
+"""トレースファイルのリプレイ
+
+python replay.py トレースファイル --config 設定ファイル [--speed 倍率]
+
+記録したボタン操作・チャット回答を、Discordの代わりのスタブを使って
+main.pyのハンドラーにそのまま流し込む。乱数シードは記録時のものを使うため、
+選択肢の並びを含めて送信内容が記録と一致するかを確認できる。
+最後にイベント種別ごとのハンドラー処理時間と、記録時の送信時間を集計して表示する。
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+class StubUser:
+    def __init__(self, user_id, display_name=None):
+        self.id = user_id
+        self.display_name = display_name or f"ユーザー{user_id}"
+        self.name = self.display_name
+        self.bot = False
+
+class StubMessage:
+    def __init__(self, content=None, author=None, guild=None, channel=None):
+        self.id = 0
+        self.content = content
+        self.author = author
+        self.guild = guild
+        self.channel = channel
+        self.components = []
+
+    async def edit(self, **kwargs):
+        pass
+
+    async def delete(self):
+        pass
+
+    async def pin(self):
+        pass
+
+    async def unpin(self):
+        pass
+
+class StubFile:
+    def __init__(self, fp, filename=None):
+        self.fp = fp
+        self.filename = filename or os.path.basename(str(fp))
+
+class StubChannel:
+    def __init__(self, channel_id, replayer):
+        self.id = channel_id
+        self.name = f"channel{channel_id}"
+        self.replayer = replayer
+
+    async def send(self, content=None, **kwargs):
+        event = {"text": content}
+        if kwargs.get("file") is not None:
+            event["file"] = kwargs["file"].filename
+        if kwargs.get("view") is not None:
+            event["opts"] = [getattr(item, "label", None) for item in kwargs["view"].children]
+        self.replayer.sent.append(event)
+        return StubMessage(content, channel=self)
+
+    async def history(self, limit=None):
+        return
+        yield
+
+class StubGuild:
+    def __init__(self, guild_id, replayer):
+        self.id = guild_id
+        self.replayer = replayer
+        self.members = []
+
+    def get_channel(self, channel_id):
+        return self.replayer.get_channel(channel_id)
+
+class StubResponse:
+    async def send_message(self, *args, **kwargs):
+        pass
+
+    async def edit_message(self, **kwargs):
+        pass
+
+class StubBot:
+    def __init__(self, replayer, command_prefix='/'):
+        self.replayer = replayer
+        self.command_prefix = command_prefix
+        self.user = StubUser(0, "replay-bot")
+
+    def get_guild(self, guild_id):
+        return self.replayer.get_guild(guild_id)
+
+    def get_user(self, user_id):
+        return self.replayer.users.get(user_id)
+
+    async def fetch_user(self, user_id):
+        return self.replayer.users.get(user_id) or StubUser(user_id)
+
+class Replayer:
+    """トレースのイベントをmain.pyのハンドラーに流し込む"""
+
+    def __init__(self, main_module, header, events, speed=1.0):
+        self.main = main_module
+        self.header = header
+        self.events = events
+        self.speed = speed
+        self.guilds = {}
+        self.channels = {}
+        self.users = {}
+        self.sent = []
+        self.timings = defaultdict(list)
+
+    def get_guild(self, guild_id):
+        if guild_id not in self.guilds:
+            self.guilds[guild_id] = StubGuild(guild_id, self)
+        return self.guilds[guild_id]
+
+    def get_channel(self, channel_id):
+        if channel_id not in self.channels:
+            self.channels[channel_id] = StubChannel(channel_id, self)
+        return self.channels[channel_id]
+
+    def get_user(self, user_id, display_name=None):
+        if user_id not in self.users:
+            self.users[user_id] = StubUser(user_id, display_name)
+        return self.users[user_id]
+
+    def setup(self):
+        """main.pyのボット・ゲームマネージャーをスタブに差し替える"""
+        import discord
+        from game_manager import GameManager
+        if not isinstance(self.main.game_manager, GameManager):
+            raise RuntimeError("リプレイはengine_socketを設定していない設定ファイルで実行してください")
+        discord.File = StubFile
+        bot = StubBot(self)
+        main = self.main
+        main.bot = bot
+        main.trace_recorder = None
+        main.command_handler.bot = bot
+        main.command_handler.trace_recorder = None
+        main.command_handler.scoreboard.bot = bot
+        game_manager = main.game_manager
+        game_manager.bot = bot
+        game_manager.result_store = None
+        game_manager.log_path = os.devnull
+        game_manager.seed = self.header["seed"]
+        game_manager.random.seed(self.header["seed"])
+        # タイマーだけを縮め、得点は記録時の回答時間を基準に計算する（回答時間は記録時の値を復元するため）
+        game_manager.scoring_seconds = self.header.get("answer_seconds", game_manager.answer_seconds)
+        game_manager.answer_seconds = game_manager.scoring_seconds / self.speed
+        game_manager.speed_reveal_seconds = game_manager.speed_reveal_seconds / self.speed
+
+    def build_interaction(self, event):
+        user = self.get_user(event["u"], event.get("n"))
+        guild = self.get_guild(event["g"])
+        if "m" in event:
+            # 開始ボタン：記録時のメンバーでスコアを初期化する
+            members = [self.get_user(member_id, name) for member_id, name in event["m"]]
+            game_guild_id = self.main.GAME_GUILD_ID
+            (self.get_guild(game_guild_id) if game_guild_id else guild).members = members
+        return SimpleNamespace(
+            type=SimpleNamespace(name="component"),
+            data={"custom_id": event["id"]},
+            user=user,
+            guild=guild,
+            channel=self.get_channel(event["c"]),
+            message=None,
+            response=StubResponse(),
+        )
+
+    def restore_elapsed(self, event):
+        """記録時の回答時間になるよう出題時刻をずらす
+
+        スタブの送信は時間がかからず、再生速度も変えられるため、
+        イベントの時刻からは記録時と同じ回答時間にならない。
+        """
+        if "e" not in event:
+            return
+        game_state = self.main.game_manager.get_game_state(self.main.GAME_GUILD_ID or event["g"])
+        if game_state and game_state.get("round_started_at") is not None:
+            game_state["round_started_at"] = time.monotonic() - event["e"]
+
+    async def run(self):
+        self.setup()
+        started_at = time.monotonic()
+        for event in self.events:
+            if event["k"] == "send":
+                continue
+            delay = started_at + event["t"] / 1000 / self.speed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if event["k"] in ("cmd", "ans"):
+                key = event["id"] if event["k"] == "cmd" else "回答ボタン"
+                handler = self.main.on_interaction(self.build_interaction(event))
+            elif event["k"] == "msg":
+                key = "チャット回答"
+                author = self.get_user(event["u"], event.get("n"))
+                message = StubMessage(event["text"], author, self.get_guild(event["g"]), self.get_channel(event["c"]))
+                handler = self.main.on_typed_answer(message)
+            else:
+                continue
+            self.restore_elapsed(event)
+            handler_started_at = time.perf_counter()
+            await handler
+            self.timings[key].append((time.perf_counter() - handler_started_at) * 1000)
+        # 回答時間のタイマーなど残りのタスクの完了を待つ
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        if pending:
+            await asyncio.wait(pending)
+        return time.monotonic() - started_at
+
+    def report(self, duration):
+        """処理時間と記録との一致状況を表示"""
+        print(f"=== リプレイ結果（{self.speed}倍速, {duration:.2f}秒） ===")
+        print("ハンドラー処理時間 [ms]:")
+        for key, values in sorted(self.timings.items(), key=lambda item: -sum(item[1])):
+            p95 = sorted(values)[int(len(values) * 0.95) if len(values) > 1 else 0]
+            print(f"  {key}: {len(values)}件 合計 {sum(values):.1f} 平均 {statistics.mean(values):.2f} p95 {p95:.2f} 最大 {max(values):.2f}")
+
+        recorded = [event for event in self.events if event["k"] == "send"]
+        network = defaultdict(list)
+        for event in recorded:
+            kind = "音声ファイル" if event.get("file") else "選択肢" if event.get("opts") else "テキスト"
+            network[kind].append(event.get("d", 0))
+        print("記録時の送信時間 [ms]:")
+        for kind, values in network.items():
+            print(f"  {kind}: {len(values)}件 合計 {sum(values):.1f} 平均 {statistics.mean(values):.1f} 最大 {max(values):.1f}")
+
+        expected = [{key: event.get(key) for key in ("text", "file", "opts") if event.get(key) is not None} for event in recorded]
+        actual = [{key: value for key, value in event.items() if value is not None} for event in self.sent]
+        mismatch = next((i for i, (a, b) in enumerate(zip(expected, actual)) if a != b), None)
+        if mismatch is None and len(expected) == len(actual):
+            print(f"送信内容: 記録と一致（{len(actual)}件）")
+        else:
+            print(f"送信内容: 記録と不一致（記録 {len(expected)}件, リプレイ {len(actual)}件）")
+            if mismatch is not None:
+                print(f"  {mismatch + 1}件目 記録: {expected[mismatch]}")
+                print(f"  {mismatch + 1}件目 リプレイ: {actual[mismatch]}")
+            return False
+        return True
+
+def load_trace(path):
+    with open(path, encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        events = [json.loads(line) for line in f if line.strip()]
+    return header, events
+
+async def main_async(args):
+    header, events = load_trace(args.trace)
+    # main.pyの読み込み時にトレース記録が始まらないようにする
+    sys.argv = [sys.argv[0], '--config', args.config or header.get("config", "config.ini"), '--no-trace']
+    import main
+    replayer = Replayer(main, header, events, speed=args.speed)
+    duration = await replayer.run()
+    return replayer.report(duration)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='トレースファイルのリプレイ')
+    parser.add_argument('trace', type=str, help='トレースファイルのパス')
+    parser.add_argument('--config', type=str, default=None, help='設定ファイル(.ini)のパス（省略時は記録時のパス）')
+    parser.add_argument('--speed', type=float, default=1.0, help='再生速度の倍率（例: 10で10倍速）')
+    ok = asyncio.run(main_async(parser.parse_args()))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,166 @@
+import sqlite3
+import datetime
+
+class ResultStore:
+    """ゲーム結果の永続化とランキング集計
+
+    回答はラウンド終了時、最終結果はゲーム終了時にまとめて書き込む。
+    ランキング用の集計テーブル（月別プレイヤー成績・楽曲別正答率）も
+    同じトランザクションで更新するため、回答行が数百万件あっても
+    ランキング取得は回答テーブルを走査しない。
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS games (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        guild_id INTEGER NOT NULL,
+        started_at INTEGER NOT NULL,
+        ended_at INTEGER,
+        rounds INTEGER
+    );
+    CREATE TABLE IF NOT EXISTS answers (
+        game_id INTEGER NOT NULL,
+        round_num INTEGER NOT NULL,
+        song_id INTEGER,
+        user_id INTEGER NOT NULL,
+        answer TEXT,
+        correct INTEGER NOT NULL,
+        elapsed_ms INTEGER,
+        answered_at INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS game_results (
+        game_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        score INTEGER NOT NULL,
+        rank INTEGER NOT NULL,
+        PRIMARY KEY (game_id, user_id)
+    );
+    CREATE TABLE IF NOT EXISTS player_monthly (
+        month TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        answers INTEGER NOT NULL DEFAULT 0,
+        correct INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (month, user_id)
+    );
+    CREATE TABLE IF NOT EXISTS song_stats (
+        song_id INTEGER PRIMARY KEY,
+        answers INTEGER NOT NULL DEFAULT 0,
+        correct INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_answers_game ON answers (game_id, round_num);
+    CREATE INDEX IF NOT EXISTS idx_answers_user_time ON answers (user_id, answered_at);
+    CREATE INDEX IF NOT EXISTS idx_answers_song ON answers (song_id, correct);
+    CREATE INDEX IF NOT EXISTS idx_player_monthly_rank ON player_monthly (month, correct DESC);
+    CREATE INDEX IF NOT EXISTS idx_game_results_user ON game_results (user_id);
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        # 回答時間カラムが無い古いDBを移行
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(answers)")]
+        if "elapsed_ms" not in columns:
+            self.conn.execute("ALTER TABLE answers ADD COLUMN elapsed_ms INTEGER")
+        self.conn.commit()
+
+    def close(self):
+        """接続を閉じる"""
+        self.conn.close()
+
+    def start_game(self, guild_id, rounds):
+        """ゲーム開始を記録してゲームIDを返す"""
+        now = int(datetime.datetime.now().timestamp())
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO games (guild_id, started_at, rounds) VALUES (?, ?, ?)",
+                (guild_id, now, rounds))
+        return cursor.lastrowid
+
+    def record_round(self, game_id, round_num, song_id, round_answers):
+        """1ラウンド分の回答をまとめて書き込む
+
+        round_answers: (user_id, answer, correct, elapsed) のイテラブル（elapsedは秒）
+        """
+        self.record_rounds(game_id, [(round_num, song_id, round_answers)])
+
+    def record_rounds(self, game_id, rounds):
+        """複数ラウンド分の回答を1回のトランザクションで書き込む
+
+        rounds: (round_num, song_id, round_answers) のイテラブル
+        """
+        now = datetime.datetime.now()
+        with self.conn:
+            for round_num, song_id, round_answers in rounds:
+                self._insert_round(game_id, round_num, song_id, round_answers, now)
+
+    def _insert_round(self, game_id, round_num, song_id, round_answers, now):
+        """1ラウンド分の回答を書き込む（トランザクション内で呼ぶ）"""
+        answered_at = int(now.timestamp())
+        month = now.strftime('%Y-%m')
+        rows = [(game_id, round_num, song_id, user_id, answer, int(bool(correct)), int(elapsed * 1000), answered_at)
+                for user_id, answer, correct, elapsed in round_answers]
+        if not rows:
+            return
+        self.conn.executemany(
+            "INSERT INTO answers (game_id, round_num, song_id, user_id, answer, correct, elapsed_ms, answered_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self.conn.executemany(
+            "INSERT INTO player_monthly (month, user_id, answers, correct) VALUES (?, ?, 1, ?) "
+            "ON CONFLICT (month, user_id) DO UPDATE SET "
+            "answers = answers + 1, correct = correct + excluded.correct",
+            [(month, row[3], row[5]) for row in rows])
+        if song_id is not None:
+            correct_count = sum(row[5] for row in rows)
+            self.conn.execute(
+                "INSERT INTO song_stats (song_id, answers, correct) VALUES (?, ?, ?) "
+                "ON CONFLICT (song_id) DO UPDATE SET "
+                "answers = answers + excluded.answers, correct = correct + excluded.correct",
+                (song_id, len(rows), correct_count))
+
+    def record_final(self, game_id, sorted_scores):
+        """最終結果（順位付きスコア）をまとめて書き込む"""
+        now = int(datetime.datetime.now().timestamp())
+        rows = []
+        rank = 1
+        prev_score = None
+        for i, (user_id, score) in enumerate(sorted_scores):
+            if prev_score is not None and score < prev_score:
+                rank = i + 1
+            rows.append((game_id, user_id, score, rank))
+            prev_score = score
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO game_results (game_id, user_id, score, rank) VALUES (?, ?, ?, ?)",
+                rows)
+            self.conn.execute("UPDATE games SET ended_at = ? WHERE id = ?", (now, game_id))
+
+    def monthly_leaderboard(self, month=None, limit=10):
+        """月間の正解数ランキング [(user_id, correct, answers), ...]
+
+        month: 'YYYY-MM'形式（省略時は今月）
+        """
+        if month is None:
+            month = datetime.datetime.now().strftime('%Y-%m')
+        cursor = self.conn.execute(
+            "SELECT user_id, correct, answers FROM player_monthly "
+            "WHERE month = ? ORDER BY correct DESC LIMIT ?", (month, limit))
+        return cursor.fetchall()
+
+    def player_history(self, user_id, since=None, limit=100):
+        """プレイヤーの回答履歴 [(game_id, round_num, song_id, answer, correct, answered_at), ...]"""
+        since_ts = int(since.timestamp()) if since else 0
+        cursor = self.conn.execute(
+            "SELECT game_id, round_num, song_id, answer, correct, answered_at FROM answers "
+            "WHERE user_id = ? AND answered_at >= ? ORDER BY answered_at DESC LIMIT ?",
+            (user_id, since_ts, limit))
+        return cursor.fetchall()
+
+    def hardest_songs(self, limit=10, min_answers=5):
+        """正答率の低い楽曲 [(song_id, correct_rate, answers), ...]"""
+        cursor = self.conn.execute(
+            "SELECT song_id, CAST(correct AS REAL) / answers AS rate, answers FROM song_stats "
+            "WHERE answers >= ? ORDER BY rate ASC, answers DESC LIMIT ?", (min_answers, limit))
+        return cursor.fetchall()
@@ -0,0 +1,53 @@
+import statistics
+from array import array
+
+class RoundAnswers:
+    """1ラウンド分の回答を配列で保持
+
+    回答の到着順に、ユーザーID・出題からの経過秒数・正誤を
+    それぞれ型付き配列に追記する（回答1件あたり十数バイト）。
+    """
+
+    __slots__ = ("user_ids", "elapsed", "correct", "answers", "_answered")
+
+    def __init__(self):
+        self.user_ids = array('q')
+        self.elapsed = array('d')
+        self.correct = bytearray()
+        self.answers = []
+        self._answered = set()
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def __contains__(self, user_id):
+        return user_id in self._answered
+
+    def __iter__(self):
+        """(user_id, answer, correct, elapsed) を到着順に返す"""
+        for i in range(len(self.user_ids)):
+            yield self.user_ids[i], self.answers[i], bool(self.correct[i]), self.elapsed[i]
+
+    def add(self, user_id, answer, correct, elapsed):
+        """回答を追記"""
+        self._answered.add(user_id)
+        self.user_ids.append(user_id)
+        self.elapsed.append(elapsed)
+        self.correct.append(1 if correct else 0)
+        self.answers.append(answer)
+
+    def stats(self):
+        """正解者の回答時間の統計（正解者がいない場合はNone）
+
+        戻り値: {"count", "fastest_user_id", "fastest", "median"}
+        """
+        times = [t for t, ok in zip(self.elapsed, self.correct) if ok]
+        if not times:
+            return None
+        fastest = min(range(len(self.elapsed)), key=lambda i: self.elapsed[i] if self.correct[i] else float('inf'))
+        return {
+            "count": len(times),
+            "fastest_user_id": self.user_ids[fastest],
+            "fastest": self.elapsed[fastest],
+            "median": statistics.median(times),
+        }
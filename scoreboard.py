@@ -0,0 +1,152 @@
+import discord
+
+MESSAGE_LIMIT = 2000  # Discordのメッセージ本文の上限文字数
+
+class ScoreboardRenderer:
+    """スコアボードの描画と、ピン留めしたスコアボードメッセージの更新
+
+    プレイヤーごとの行を（順位・表示名・得点）をキーにキャッシュし、
+    変化した行だけを作り直す。本文が上限を超える場合はページに分け、
+    1件のメッセージをページ切り替えボタンで切り替えて表示する。
+    """
+
+    def __init__(self, bot, limit=MESSAGE_LIMIT):
+        self.bot = bot
+        self.limit = limit
+        self.names = {}  # 表示名のキャッシュ {user_id: 表示名}
+        self.lines = {}  # 描画済みの行 {game_guild_id: {user_id: (キー, 行)}}
+        self.rendered = {}  # 前回の描画結果 {game_guild_id: (キーの並び, ページ)}
+        self.boards = {}  # 更新中のスコアボード {game_guild_id: メッセージ}
+        self.pages = {}  # メッセージごとのページ {message_id: [ページ, ...]}
+        self.final_boards = {}  # 直前のゲームの最終順位 {game_guild_id: メッセージ}
+
+    async def resolve_name(self, user_id):
+        """表示名を取得（キャッシュにない場合のみfetch_userを呼ぶ）"""
+        user = self.bot.get_user(user_id)
+        if user is None and user_id not in self.names:
+            try:
+                user = await self.bot.fetch_user(user_id)
+            except Exception:
+                self.names[user_id] = f"ユーザーID:{user_id}"
+        if user is not None:
+            self.names[user_id] = user.display_name
+        return self.names[user_id]
+
+    async def render(self, game_guild_id, sorted_scores, final=False):
+        """スコアボードの本文をページのリストで返す"""
+        lines = self.lines.setdefault(game_guild_id, {})
+        keys = []
+        rows = []
+        rank = 0
+        prev_score = None
+        for i, (user_id, score) in enumerate(sorted_scores):
+            if score != prev_score:
+                rank = i + 1
+                prev_score = score
+            name = await self.resolve_name(user_id)
+            key = (rank if final else None, name, score)
+            cached = lines.get(user_id)
+            if cached is None or cached[0] != key:
+                line = f"{rank}位: {name} ({score}点)\n" if final else f"{name}: {score}点\n"
+                cached = lines[user_id] = (key, line)
+            keys.append((user_id, key))
+            rows.append(cached[1])
+
+        title = "**--- 最終順位 ---**\n" if final else "**--- 現在のスコア ---**\n"
+        # どの行も変わっていなければ前回のページをそのまま使う
+        signature = (title, tuple(keys))
+        previous = self.rendered.get(game_guild_id)
+        if previous and previous[0] == signature:
+            return previous[1]
+        pages = self.paginate(title, rows)
+        self.rendered[game_guild_id] = (signature, pages)
+        return pages
+
+    def paginate(self, title, rows):
+        """見出しとページ番号を含めて上限文字数に収まるようにページ分割"""
+        footer_size = 16  # 「（99/99ページ）」の分
+        budget = self.limit - len(title) - footer_size
+        chunks = [[]]
+        size = 0
+        for row in rows:
+            if chunks[-1] and size + len(row) > budget:
+                chunks.append([])
+                size = 0
+            chunks[-1].append(row)
+            size += len(row)
+        if len(chunks) == 1:
+            return [title + "".join(chunks[0])]
+        return [f"{title}{''.join(chunk)}（{i + 1}/{len(chunks)}ページ）" for i, chunk in enumerate(chunks)]
+
+    def create_page_buttons(self, page, page_count):
+        """ページ切り替えボタン（1ページのみの場合はNone）"""
+        if page_count <= 1:
+            return None
+        view = discord.ui.View(timeout=None)
+        view.add_item(discord.ui.Button(label="◀", style=discord.ButtonStyle.secondary, custom_id=f"scoreboard_page_{page - 1}", disabled=page == 0))
+        view.add_item(discord.ui.Button(label="▶", style=discord.ButtonStyle.secondary, custom_id=f"scoreboard_page_{page + 1}", disabled=page == page_count - 1))
+        return view
+
+    async def publish(self, game_guild_id, channel, sorted_scores, final=False):
+        """スコアボードメッセージを更新（まだない場合は送信してピン留め）
+
+        最終順位を表示した後も、end_gameが呼ばれるまでは同じメッセージを更新する。
+        終了したゲームのスコアボードは次のゲームのスコアボードを送信するまで
+        ピン留めしたまま残し、送信した時点でピン留めを外してページも破棄する
+        （ピン留めの上限とページの保持が積み上がらないように、1サーバーにつき1件まで）。
+        """
+        pages = await self.render(game_guild_id, sorted_scores, final=final)
+        view = self.create_page_buttons(0, len(pages))
+        message = self.boards.get(game_guild_id)
+        if message is not None:
+            try:
+                await message.edit(content=pages[0], view=view)
+            except discord.HTTPException as e:
+                # 削除された場合などは送り直す
+                print(f"スコアボード更新エラー: {e}")
+                self.pages.pop(message.id, None)
+                message = None
+        if message is None:
+            message = await channel.send(pages[0], view=view)
+            await self.retire_final_board(game_guild_id)
+            try:
+                await message.pin()
+            except Exception as e:
+                print(f"スコアボードのピン留めエラー: {e}")
+        self.pages[message.id] = pages
+
+        self.boards[game_guild_id] = message
+        return message
+
+    def end_game(self, game_guild_id):
+        """ゲームの終了時（または次のゲームの開始時）に呼ぶ
+
+        以降のpublishは新しいスコアボードを送信し、このゲームのスコアボードのピン留めを外す。
+        """
+        message = self.boards.pop(game_guild_id, None)
+        if message is not None:
+            self.final_boards[game_guild_id] = message
+        self.lines.pop(game_guild_id, None)
+        self.rendered.pop(game_guild_id, None)
+
+    async def retire_final_board(self, game_guild_id):
+        """前のゲームの最終順位のピン留めを外し、ページを破棄する"""
+        message = self.final_boards.pop(game_guild_id, None)
+        if message is None:
+            return
+        self.pages.pop(message.id, None)
+        try:
+            await message.unpin()
+        except Exception as e:
+            print(f"スコアボードのピン留め解除エラー: {e}")
+
+    async def handle_page_button(self, interaction):
+        """ページ切り替えボタンの処理"""
+        message = interaction.message
+        pages = self.pages.get(message.id) if message else None
+        if not pages:
+            await interaction.response.send_message("このスコアボードは表示できません。", ephemeral=True, delete_after=5.0)
+            return
+        page = int(interaction.data['custom_id'].replace("scoreboard_page_", ""))
+        page = max(0, min(page, len(pages) - 1))
+        await interaction.response.edit_message(content=pages[page], view=self.create_page_buttons(page, len(pages)))
@@ -0,0 +1,39 @@
+import time
+from contextlib import contextmanager
+
+class StartupProfiler:
+    """起動処理の段階ごとの所要時間を記録
+
+    mark()は前回のmark()からの経過時間を1段階として記録し、
+    phase()はwithブロック内の所要時間を記録する（バックグラウンド処理用）。
+    """
+
+    def __init__(self, started_at=None):
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.last_mark = self.started_at
+        self.phases = []  # [(段階名, 秒), ...]
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last_mark))
+        self.last_mark = now
+
+    @contextmanager
+    def phase(self, name):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started_at))
+
+    def elapsed(self):
+        """プロセス開始からの経過秒数"""
+        return time.perf_counter() - self.started_at
+
+    def report(self):
+        """段階ごとの所要時間を表示"""
+        print("=== 起動プロファイル ===")
+        width = max((len(name) for name, _ in self.phases), default=0)
+        for name, seconds in self.phases:
+            print(f"  {name.ljust(width)}  {seconds * 1000:9.1f}ms")
+        print(f"  {'合計'.ljust(width)}  {self.elapsed() * 1000:9.1f}ms（プロセス開始から）")
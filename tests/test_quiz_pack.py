@@ -0,0 +1,70 @@
+import configparser
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quiz_pack import QuizPack, build_pack, write_pack
+
+class QuizPackTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        self.clips = []
+        for i in range(3):
+            path = os.path.join(self.dir, f"clip{i}.mp3")
+            with open(path, 'wb') as f:
+                f.write(os.urandom(1000 + i * 7))
+            self.clips.append(path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_round_trip(self):
+        rounds = [{"song_id": i + 1, "title": f"曲{i}", "artist": "歌手", "question": None,
+                   "choices": [f"曲{i}", "A", "B", "C"], "filename": os.path.basename(path)}
+                  for i, path in enumerate(self.clips)]
+        catalog = [(i + 1, f"曲{i}", "歌手") for i in range(3)]
+        pack_path = os.path.join(self.dir, "event.mqpack")
+        write_pack(pack_path, rounds, catalog, self.clips, title="テスト")
+
+        pack = QuizPack(pack_path)
+        self.assertEqual(pack.title, "テスト")
+        self.assertEqual(pack.rounds, rounds)
+        self.assertEqual(pack.catalog, catalog)
+        for i, path in enumerate(self.clips):
+            self.assertEqual(bytes(pack.clip(i)), self.read(path))
+            reader = pack.open_clip(i)
+            self.assertEqual(reader.read(10), self.read(path)[:10])
+            reader.seek(0)
+            self.assertEqual(reader.read(), self.read(path))
+            reader.close()
+
+    def test_build_ignores_configured_pack(self):
+        db_path = os.path.join(self.dir, "songs.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE songs (id INTEGER PRIMARY KEY, title TEXT, artist TEXT, path TEXT)")
+        for i, path in enumerate(self.clips):
+            conn.execute("INSERT INTO songs VALUES (?, ?, ?, ?)", (i + 1, f"曲{i}", "歌手", path))
+        conn.commit()
+        conn.close()
+
+        pack_path = os.path.join(self.dir, "event.mqpack")
+        config_ini = configparser.ConfigParser()
+        config_ini['DEFAULT'] = {'db_path': db_path, 'rounds': '2', 'song_ids': '2, 3', 'random_seed': '1', 'quiz_pack': pack_path}
+        self.assertEqual(build_pack(config_ini, pack_path), 2)
+
+        pack = QuizPack(pack_path)
+        self.assertEqual([r["title"] for r in pack.rounds], ["曲1", "曲2"])
+        self.assertEqual(bytes(pack.clip(1)), self.read(self.clips[2]))
+        self.assertEqual(config_ini.get('DEFAULT', 'quiz_pack'), pack_path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import unicodedata
+from collections import defaultdict
+
+# カタカナ→ひらがな変換テーブル（ァ〜ヶ）
+_KANA_TABLE = {code: code - 0x60 for code in range(0x30A1, 0x30F7)}
+
+def normalize(text: str):
+    """曲名を比較用に正規化（全角半角・大文字小文字・カタカナひらがなの違いと記号・空白を除去）"""
+    text = unicodedata.normalize('NFKC', text).casefold().translate(_KANA_TABLE)
+    return ''.join(c for c in text if c.isalnum() or c == 'ー')
+
+def ngrams(text: str, n=2):
+    """文字n-gramの集合（n文字未満の場合は文字列そのもの）"""
+    if len(text) < n:
+        return frozenset((text,)) if text else frozenset()
+    return frozenset(text[i:i + n] for i in range(len(text) - n + 1))
+
+class TitleIndex:
+    """楽曲タイトルの正規化済みインデックス
+
+    正規化後の完全一致は辞書で、タイプミスを含む入力は文字bigramの
+    Dice係数で判定する。正解曲との類似度が閾値に届かないメッセージは
+    bigramを一度作るだけで棄却されるため、チャットが大量に流れても
+    1メッセージあたりの判定コストはカタログの大きさに依存しない。
+    """
+
+    def __init__(self, titles, threshold=0.75, max_postings=2000):
+        self.threshold = threshold
+        self.max_postings = max_postings  # これより多くの曲に含まれるbigramは候補検索に使わない
+        self.titles = []
+        self.normalized = []
+        self.grams = []
+        self.exact = {}  # {正規化タイトル: index}
+        self.by_title = {}  # {元のタイトル: index}
+        self.postings = defaultdict(list)  # {bigram: [index, ...]}
+        for title in titles:
+            self.add(title)
+
+    def add(self, title: str):
+        """タイトルを追加してindexを返す（登録済みの場合は既存のindex）"""
+        if title in self.by_title:
+            return self.by_title[title]
+        norm = normalize(title)
+        index = len(self.titles)
+        grams = ngrams(norm)
+        self.titles.append(title)
+        self.normalized.append(norm)
+        self.grams.append(grams)
+        self.by_title[title] = index
+        self.exact.setdefault(norm, index)
+        for gram in grams:
+            self.postings[gram].append(index)
+        return index
+
+    def _dice(self, grams_a, grams_b):
+        if not grams_a or not grams_b:
+            return 0.0
+        return 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+
+    def prepare(self, correct_title: str):
+        """正解タイトルの判定用データを作成（出題時に1回だけ呼ぶ。インデックスは変更しない）
+
+        正解曲とbigramを共有するカタログ内の曲を、共有するbigram数と
+        bigram数ごとにまとめて対抗候補として持つ。入力が正解曲に閾値以上近い場合、
+        正解曲とbigramを共有しない曲が正解曲より近くなることはほぼない。
+        """
+        index = self.by_title.get(correct_title)
+        if index is not None:
+            norm, grams = self.normalized[index], self.grams[index]
+        else:
+            norm = normalize(correct_title)
+            grams = ngrams(norm)
+        window = max(1, len(norm) // 2)
+        # Dice係数が閾値に届くにはbigram数の比が threshold / (2 - threshold) 以上必要
+        max_size = (len(norm) + window) * (2 - self.threshold) / self.threshold if self.threshold > 0 else float('inf')
+        candidates = set()
+        for gram in grams:
+            posting = self.postings.get(gram)
+            if posting and len(posting) <= self.max_postings:
+                candidates.update(posting)
+        groups = defaultdict(list)
+        for i in candidates:
+            rival = self.grams[i]
+            if self.normalized[i] != norm and len(rival) <= max_size:
+                groups[(len(grams & rival), len(rival))].append(rival)
+        return {
+            "norm": norm,
+            "grams": grams,
+            "window": window,
+            "rivals": [(overlap, size, rivals) for (overlap, size), rivals in groups.items()],
+        }
+
+    def match(self, text: str, target):
+        """入力が正解タイトルを指しているかを判定（targetはprepareの戻り値）"""
+        norm = normalize(text)
+        if not norm:
+            return False
+        correct_norm = target["norm"]
+        if norm == correct_norm:
+            return True
+        # 別の曲名と完全一致する場合は不正解
+        if norm in self.exact:
+            return False
+        # 長さが大きく異なる場合はbigramを作らずに棄却
+        if abs(len(norm) - len(correct_norm)) > target["window"]:
+            return False
+        grams = ngrams(norm)
+        score = self._dice(grams, target["grams"])
+        if score < self.threshold:
+            return False
+        # 正解曲と同じか、より近い曲がカタログにある場合は不正解
+        # 対抗曲との共通bigram数は「正解曲との共通数 + 入力にだけあるbigram数」以下なので、
+        # その上限でも届かないグループはまとめて読み飛ばす
+        extra = len(grams - target["grams"])
+        for overlap, size, rivals in target["rivals"]:
+            if 2 * (overlap + extra) / (len(grams) + size) < score:
+                continue
+            for rival in rivals:
+                if 2 * len(grams & rival) / (len(grams) + size) >= score:
+                    return False
+        return True
@@ -0,0 +1,91 @@
+import json
+import time
+import datetime
+
+class TraceRecorder:
+    """ゲーム中のイベントをトレースファイル（JSON Lines）に記録
+
+    1行目はヘッダー（乱数シード・設定値）、以降は1イベント1行で
+    記録開始からの経過ミリ秒"t"とイベント種別"k"を持つ。
+
+    k = "cmd"  コマンドボタン  (id: custom_id, u: ユーザーID, n: 表示名, g: サーバーID, c: チャンネルID)
+    k = "ans"  回答ボタン      (同上, e: 出題からの経過秒数)
+    k = "msg"  チャット回答    (u, n, g, c, text, e)
+    k = "send" 送信メッセージ  (c, text, file: ファイル名, opts: ボタンのラベル, d: 送信にかかったミリ秒)
+    """
+
+    def __init__(self, path, seed, **header):
+        # パスには日時の書式（%Y%m%d_%H%M%Sなど）を使える。起動ごとに別ファイルに記録される
+        self.path = datetime.datetime.now().strftime(path)
+        self.started_at = time.monotonic()
+        self.file = open(self.path, 'w', encoding='utf-8')
+        self._write({"v": 1, "seed": seed, **header})
+
+    def _write(self, event):
+        self.file.write(json.dumps(event, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.file.flush()
+
+    def _elapsed_ms(self):
+        return round((time.monotonic() - self.started_at) * 1000, 1)
+
+    def record(self, kind, **data):
+        """イベントを1件記録"""
+        self._write({"t": self._elapsed_ms(), "k": kind, **data})
+
+    def record_interaction(self, interaction, members=None, elapsed=None):
+        """ボタン操作を記録（開始ボタンの場合はゲームサーバーのメンバーも記録）"""
+        custom_id = interaction.data.get('custom_id')
+        if not custom_id:
+            return
+        event = {
+            "id": custom_id,
+            "u": interaction.user.id,
+            "n": interaction.user.display_name,
+            "g": interaction.guild.id if interaction.guild else None,
+            "c": interaction.channel.id if interaction.channel else None,
+        }
+        if members is not None:
+            event["m"] = [[m.id, m.display_name] for m in members if not m.bot]
+        if elapsed is not None:
+            event["e"] = round(elapsed, 6)
+        self.record("cmd" if custom_id.startswith("cmd_") else "ans", **event)
+
+    def record_message(self, message, elapsed=None):
+        """チャット回答のメッセージを記録"""
+        event = {"u": message.author.id, "n": message.author.display_name,
+                 "g": message.guild.id, "c": message.channel.id, "text": message.content}
+        if elapsed is not None:
+            event["e"] = round(elapsed, 6)
+        self.record("msg", **event)
+
+    def wrap_channel(self, channel):
+        """送信内容を記録するチャンネルのラッパーを返す"""
+        if channel is None or isinstance(channel, RecordingChannel):
+            return channel
+        return RecordingChannel(channel, self)
+
+    def close(self):
+        self.file.close()
+
+class RecordingChannel:
+    """send()の内容と所要時間を記録してから元のチャンネルに委譲する"""
+
+    def __init__(self, channel, recorder):
+        self._channel = channel
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._channel, name)
+
+    async def send(self, content=None, **kwargs):
+        started_at = time.monotonic()
+        try:
+            return await self._channel.send(content, **kwargs)
+        finally:
+            event = {"c": self._channel.id, "text": content,
+                     "d": round((time.monotonic() - started_at) * 1000, 1)}
+            if kwargs.get("file") is not None:
+                event["file"] = kwargs["file"].filename
+            if kwargs.get("view") is not None:
+                event["opts"] = [getattr(item, "label", None) for item in kwargs["view"].children]
+            self._recorder.record("send", **event)